@@ -0,0 +1,211 @@
+import os
+import json
+import queue
+import threading
+from itertools import count
+
+class EditLog(object):
+    """Append-only edit log used for autosaving and crash recovery.
+
+    Records are queued from the GUI thread and written in batches by a
+    background thread, so recording an edit only costs a queue insert.
+    Periodically, the full page state is compacted into autosave
+    sidecars next to the regular `.py.box`/`.py.ell` files, after which
+    the log restarts from a base record describing those sidecars.
+
+    Args:
+        basePath (str): Sidecar base path, i.e. the box path without
+            extension.
+        batchSize (int): Maximum number of records written per batch.
+
+    Attributes:
+        logPath (str): Edit log path.
+        boxPath (str): Compacted LSTMBox path.
+        ellPath (str): Compacted TXTEll path.
+        records (int): Number of records since the last compaction.
+    """
+
+    def __init__(self, basePath, batchSize=256):
+        self.logPath, self.boxPath, self.ellPath = self.paths(basePath)
+        self.batchSize = batchSize
+
+        self.records = 0
+
+        self._ids = {}
+        self._counter = count(1)
+        self._queue = queue.Queue()
+        self._file = None
+
+        head, _ = os.path.split(self.logPath)
+        if head and not os.path.exists(head):
+            os.makedirs(head)
+
+        self._open('w')
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def paths(basePath):
+        return basePath + '.py.jnl', basePath + '.autosave.py.box', basePath + '.autosave.py.ell'
+
+    @staticmethod
+    def exists(basePath):
+        logPath, _, _ = EditLog.paths(basePath)
+
+        return os.path.exists(logPath) or os.path.exists(logPath + '.tmp')
+
+    def idOf(self, item):
+        if item not in self._ids:
+            self._ids[item] = next(self._counter)
+
+        return self._ids[item]
+
+    def record(self, item, kind, rows):
+        """Queues the current rows of an item. `None` rows delete it."""
+        if rows is None:
+            uid = self._ids.pop(item, None)
+            if uid is None:
+                return
+
+            payload = {'op': 'del', 'id': uid}
+        else:
+            payload = {'op': 'set', 'id': self.idOf(item), 'kind': kind, 'rows': rows}
+
+        self._queue.put_nowait(('record', payload))
+        self.records += 1
+
+    def compact(self, boxItems, ellItems):
+        """Queues a compaction of the full page state.
+
+        Args:
+            boxItems (list): `(item, rows)` pairs of all boxes, in
+                LSTMBox export order.
+            ellItems (list): `(item, rows)` pairs of all ellipses.
+        """
+        base = {
+            'op'  : 'base',
+            'box' : [[self.idOf(item), len(rows)] for item, rows in boxItems],
+            'ell' : [self.idOf(item) for item, _ in ellItems],
+        }
+        box = '\n'.join(row for _, rows in boxItems for row in rows)
+        ell = '::|--|::'.join(row for _, rows in ellItems for row in rows)
+
+        self._queue.put_nowait(('compact', (base, box, ell)))
+        self.records = 0
+
+    def close(self, discard=False):
+        """Flushes all pending records and stops the writer thread.
+
+        Args:
+            discard (bool): If true, the log and autosave sidecars are
+                removed, e.g. after a clean exit.
+        """
+        self._queue.put(('close', discard))
+        self._thread.join()
+
+    def _open(self, mode='a'):
+        self._file = open(self.logPath, mode, encoding='utf8')
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.batchSize:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            for cmd, payload in batch:
+                if cmd == 'record':
+                    self._file.write(json.dumps(payload, ensure_ascii=False) + '\n')
+                elif cmd == 'compact':
+                    self._compact(*payload)
+                elif cmd == 'close':
+                    self._file.close()
+                    if payload:
+                        for path in (self.logPath, self.boxPath, self.ellPath):
+                            if os.path.exists(path):
+                                os.remove(path)
+                    return
+
+            self._sync()
+
+    def _compact(self, base, box, ell):
+        self._file.close()
+
+        # The log is written last, so a complete log tmp implies complete
+        # sidecar tmps, which lets recovery roll an interrupted compaction forward.
+        for path, content in ((self.boxPath, box), (self.ellPath, ell), (self.logPath, json.dumps(base) + '\n')):
+            with open(path + '.tmp', 'w', encoding='utf8') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+
+        self._finishCompaction(self.logPath, self.boxPath, self.ellPath)
+        self._open()
+
+    @staticmethod
+    def _finishCompaction(logPath, boxPath, ellPath):
+        for path in (boxPath, ellPath, logPath):
+            if os.path.exists(path + '.tmp'):
+                os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def recover(basePath):
+        """Replays the compacted sidecars and edit log of a session.
+
+        Returns:
+            A tuple `(box, ell)` with the recovered LSTMBox and TXTEll
+            contents.
+        """
+        logPath, boxPath, ellPath = EditLog.paths(basePath)
+
+        if os.path.exists(logPath + '.tmp'):
+            EditLog._finishCompaction(logPath, boxPath, ellPath)
+
+        state = {}
+
+        with open(logPath, encoding='utf8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Last record was cut off
+                    break
+
+                if record['op'] == 'base':
+                    state = EditLog._readBase(record, boxPath, ellPath)
+                elif record['op'] == 'set':
+                    state[record['id']] = (record['kind'], record['rows'])
+                elif record['op'] == 'del':
+                    state.pop(record['id'], None)
+
+        box = '\n'.join(row for kind, rows in state.values() if kind == 'box' for row in rows)
+        ell = '::|--|::'.join(row for kind, rows in state.values() if kind == 'ell' for row in rows)
+
+        return box, ell
+
+    @staticmethod
+    def _readBase(base, boxPath, ellPath):
+        state = {}
+
+        with open(boxPath, encoding='utf8') as f:
+            lines = f.read().split('\n')
+
+        start = 0
+        for uid, n in base['box']:
+            state[uid] = ('box', lines[start:start+n])
+            start += n
+
+        with open(ellPath, encoding='utf8') as f:
+            ell = f.read()
+
+        for uid, info in zip(base['ell'], ell.split('::|--|::') if ell else []):
+            state[uid] = ('ell', [info])
+
+        return state
@@ -0,0 +1,178 @@
+from bisect import bisect_right
+
+class _Block(list):
+    __slots__ = ('pos', 'offset')
+
+class BoxList(object):
+    """Ordered list of unique items with fast positional updates.
+
+    Items are kept in blocks of bounded size, and every item maps to its
+    block, so membership is a dict lookup and removing or inserting next
+    to a known item only shifts the items of one block. Positions are
+    found from cached block offsets, which are refreshed lazily after
+    edits, and located by bisection.
+
+    Iterating while modifying the list is not supported, iterate over a
+    copy instead.
+
+    Args:
+        items (iterable): Initial items.
+        blockSize (int): Target number of items per block. Blocks are
+            split when they grow to twice that size.
+    """
+
+    def __init__(self, items=(), blockSize=256):
+        self.blockSize = blockSize
+
+        self._blocks = []
+        self._blockOf = {}
+        self._len = 0
+
+        # Index of the first block whose offset is stale
+        self._stale = 0
+        self._offsets = None
+
+        self.extend(items)
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, item):
+        return item in self._blockOf
+
+    def __iter__(self):
+        for block in self._blocks:
+            yield from block
+
+    def __reversed__(self):
+        for block in reversed(self._blocks):
+            yield from reversed(block)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(self)[i]
+
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError('BoxList index out of range')
+
+        self._refresh()
+        b = bisect_right(self._offsets, i) - 1
+        block = self._blocks[b]
+
+        return block[i - block.offset]
+
+    def __repr__(self):
+        return f'BoxList({list(self)!r})'
+
+    def append(self, item):
+        if item in self._blockOf:
+            raise ValueError('Item already in BoxList')
+
+        if not self._blocks or len(self._blocks[-1]) >= self.blockSize:
+            self._newBlock(len(self._blocks), [])
+
+        block = self._blocks[-1]
+        block.append(item)
+        self._blockOf[item] = block
+        self._len += 1
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def remove(self, item):
+        try:
+            block = self._blockOf.pop(item)
+        except KeyError:
+            raise ValueError('Item not in BoxList')
+
+        block.remove(item)
+        self._len -= 1
+
+        if block:
+            self._invalidate(block.pos + 1)
+        else:
+            del self._blocks[block.pos]
+            self._renumber(block.pos)
+
+    def index(self, item):
+        try:
+            block = self._blockOf[item]
+        except KeyError:
+            raise ValueError('Item not in BoxList')
+
+        self._refresh()
+
+        return block.offset + block.index(item)
+
+    def insertBefore(self, a, b):
+        """Moves or inserts `b` right before `a`.
+
+        Like `BoundingBoxTree.insertBefore`, an item already in the list
+        is only ever moved towards the front.
+        """
+        if b in self._blockOf:
+            if self.index(a) >= self.index(b):
+                return
+
+            self.remove(b)
+
+        block = self._blockOf[a]
+        block.insert(block.index(a), b)
+        self._blockOf[b] = block
+        self._len += 1
+        self._invalidate(block.pos + 1)
+
+        if len(block) >= 2*self.blockSize:
+            self._split(block)
+
+    def clear(self):
+        self._blocks = []
+        self._blockOf = {}
+        self._len = 0
+        self._stale = 0
+        self._offsets = None
+
+    def _newBlock(self, pos, items):
+        block = _Block(items)
+        block.offset = 0
+        self._blocks.insert(pos, block)
+        for item in items:
+            self._blockOf[item] = block
+        self._renumber(pos)
+
+        return block
+
+    def _split(self, block):
+        items = block[self.blockSize:]
+        del block[self.blockSize:]
+        self._newBlock(block.pos + 1, items)
+
+    def _renumber(self, start):
+        for pos in range(start, len(self._blocks)):
+            self._blocks[pos].pos = pos
+        self._invalidate(start)
+        self._offsets = None
+
+    def _invalidate(self, start):
+        self._stale = min(self._stale, start)
+
+    def _refresh(self):
+        blocks = self._blocks
+        if self._stale >= len(blocks) and self._offsets is not None:
+            return
+
+        if self._stale == 0:
+            offset = 0
+        else:
+            previous = blocks[self._stale - 1]
+            offset = previous.offset + len(previous)
+
+        for block in blocks[self._stale:]:
+            block.offset = offset
+            offset += len(block)
+
+        self._offsets = [block.offset for block in blocks]
+        self._stale = len(blocks)
@@ -0,0 +1,169 @@
+import re
+import math
+from functools import lru_cache
+
+from hyphenate import hyphenate_word
+from linebreak import Fragment, breakLines, SPACE, HYPHEN, JOIN, FORCED
+
+TAG = re.compile(r'<[^>]+>')
+
+def isCJK(text):
+    return any(ord(c) >= 0x2E80 for c in text)
+
+class BubbleLayout(object):
+    """Fits text into elliptical bubbles.
+
+    Finds the largest font size at which the text, broken into lines,
+    fits inside an ellipse. Every line is constrained by the chord of the
+    ellipse over the full height of the line, and lines are broken with
+    minimum raggedness (see `linebreak`). Sizes are binary searched, and
+    words are measured once per font in font units, so trying a size
+    only costs a pass over the words per line count. Measured words are
+    kept in LRU caches, so memory stays bounded over long sessions.
+
+    Args:
+        hyphenate (callable): Function splitting a word into pieces at
+            its hyphenation points.
+        lineSpacing (float): Line height multiplier.
+        minSize (int): Smallest font size in pixels that is tried.
+        maxSize (int): Largest font size in pixels that is tried.
+        hyphenPenalty (float): Line breaking cost of a hyphenated line.
+        cacheSize (int): Number of tokens and pieces to keep measured.
+    """
+
+    def __init__(self, hyphenate=hyphenate_word, lineSpacing=1.0, minSize=8, maxSize=100, hyphenPenalty=0.1, cacheSize=4096):
+        self.hyphenate = hyphenate
+        self.hyphenPenalty = hyphenPenalty
+        self.lineSpacing = lineSpacing
+        self.minSize = minSize
+        self.maxSize = maxSize
+
+        self._advances = lru_cache(maxsize=cacheSize)(self._measure)
+        self._pieces = lru_cache(maxsize=cacheSize)(self._split)
+
+    def measure(self, fontGeom, token):
+        """Returns the advance of a token in font units, ignoring markup."""
+        return self._advances(fontGeom, token)
+
+    def pieces(self, fontGeom, token):
+        """Returns the pieces a token may be broken into.
+
+        Returns:
+            A tuple of `(text, advance, kind)` tuples, where `kind` is the
+            `linebreak` boundary kind after each piece but the last.
+        """
+        return self._pieces(fontGeom, token)
+
+    @staticmethod
+    def _measure(fontGeom, token):
+        return fontGeom.getAdvance(TAG.sub('', token))
+
+    def _split(self, fontGeom, token):
+        if '<' in token:
+            parts, kind = [token], SPACE
+        elif isCJK(token):
+            parts, kind = list(token), JOIN
+        else:
+            parts, kind = self.hyphenate(token), HYPHEN
+
+        return tuple((part, self.measure(fontGeom, part), kind) for part in parts)
+
+    def fragments(self, paragraphs, fontGeom):
+        """Splits paragraphs into line breaking fragments, in font units."""
+        fragments = []
+
+        for paragraph in paragraphs:
+            for token in paragraph:
+                for text, advance, kind in self.pieces(fontGeom, token):
+                    fragments.append(Fragment(text, advance, kind))
+                fragments[-1].kind = SPACE
+
+            if fragments and paragraph:
+                fragments[-1].kind = FORCED
+            else:
+                fragments.append(Fragment('', 0, FORCED))
+
+        return fragments
+
+    @staticmethod
+    def chordWidths(n, lineHeight, a, b):
+        """Returns the usable width of each of `n` vertically centered lines.
+
+        Args:
+            n (int): Number of lines.
+            lineHeight (float): Line height.
+            a (float): Horizontal semi-axis.
+            b (float): Vertical semi-axis.
+        """
+        widths = []
+        top = -n*lineHeight/2
+
+        for i in range(n):
+            y0 = top + i*lineHeight
+            y = max(abs(y0), abs(y0 + lineHeight))
+            widths.append(2*a*math.sqrt(1 - (y/b)**2) if y < b else 0)
+
+        return widths
+
+    def layout(self, fragments, fontGeom, size, a, b):
+        """Breaks text at a given size, trying as few lines as possible.
+
+        Returns:
+            The list of lines, or `None` if the text does not fit.
+        """
+        scale = size/fontGeom.unitsPerEm
+        space = self.measure(fontGeom, ' ')
+        hyphen = self.measure(fontGeom, '-')
+
+        lineHeight = fontGeom.getLineHeight(size)*self.lineSpacing
+        maxLines = int(2*b // lineHeight)
+        minLines = sum(1 for fragment in fragments if fragment.kind == FORCED)
+
+        for n in range(minLines, maxLines + 1):
+            widths = [width/scale for width in self.chordWidths(n, lineHeight, a, b)]
+            lines = breakLines(fragments, widths, space, hyphen, self.hyphenPenalty)
+            if lines is not None:
+                return lines
+
+        return None
+
+    def fit(self, text, fontGeom, w, h, margin=0):
+        """Finds the largest font size at which text fits in an ellipse.
+
+        Args:
+            text (str): Text to fit. Newlines are kept as forced breaks.
+            fontGeom (FontGeom): Geometry of the font used to render.
+            w (float): Ellipse width.
+            h (float): Ellipse height.
+            margin (float): Inner margin of the ellipse.
+
+        Returns:
+            A tuple `(size, lines)`, or `None` if the text is blank or
+            does not fit even at the minimum size.
+        """
+        a = w/2 - margin
+        b = h/2 - margin
+        if a <= 0 or b <= 0:
+            return None
+
+        paragraphs = [paragraph.split() for paragraph in text.split('\n')]
+        if not any(paragraphs):
+            return None
+
+        fragments = self.fragments(paragraphs, fontGeom)
+
+        lo = self.minSize
+        hi = min(self.maxSize, int(2*b))
+        best = None
+
+        while lo <= hi:
+            mid = (lo + hi)//2
+            lines = self.layout(fragments, fontGeom, mid, a, b)
+
+            if lines is not None:
+                best = (mid, lines)
+                lo = mid + 1
+            else:
+                hi = mid - 1
+
+        return best
@@ -0,0 +1,138 @@
+from contextlib import contextmanager
+
+class ChangeJournal(object):
+    """Scene-level change journal.
+
+    Items (bounding boxes, groups and ellipses) are marked dirty right
+    before they are mutated, at which point their serialized rows are
+    captured. This makes checking for changes O(1), and allows a diff of
+    only the dirty items to be built, regardless of the page size.
+
+    Args:
+        describe (callable): Function mapping an item to its serialized
+            rows (a list of strings).
+
+    Attributes:
+        describe (callable): Item serializer.
+        entries (dict): Dirty items, mapped to the rows they had when
+            they were last clean. Added items map to `None`.
+        removed (set): Dirty items that have since been removed.
+        pending (dict): Items touched since the last call to
+            `takePending`, used for autosaving. Unlike `entries`, this
+            is not reset by `clear`.
+    """
+
+    def __init__(self, describe):
+        self.describe = describe
+
+        self.entries = {}
+        self.removed = set()
+        self.pending = {}
+
+        self._suspended = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def dirty(self):
+        return len(self.entries) > 0
+
+    def isDirty(self, kind=None):
+        """Checks for dirty items.
+
+        Args:
+            kind (type): If given, only items of this type are checked.
+        """
+        if kind is None:
+            return self.dirty
+
+        return any(isinstance(item, kind) for item in self.entries)
+
+    @contextmanager
+    def suspended(self):
+        """Ignores all marks within the context, e.g. while loading."""
+        self._suspended += 1
+        try:
+            yield self
+        finally:
+            self._suspended -= 1
+
+    def markDirty(self, item):
+        """Marks an item dirty. Must be called before mutating it."""
+        if self._suspended:
+            return
+
+        self.pending[item] = None
+
+        if item not in self.entries:
+            self.entries[item] = self.describe(item)
+
+    def markAdded(self, item):
+        if self._suspended:
+            return
+
+        self.pending[item] = None
+        self.entries[item] = None
+        self.removed.discard(item)
+
+    def markRemoved(self, item):
+        if self._suspended:
+            return
+
+        self.pending[item] = None
+
+        if item in self.entries:
+            if self.entries[item] is None:
+                # Added and removed again, nothing to report
+                del self.entries[item]
+                return
+        else:
+            self.entries[item] = self.describe(item)
+
+        self.removed.add(item)
+
+    def clear(self, kind=None):
+        """Marks items clean, e.g. after exporting.
+
+        Args:
+            kind (type): If given, only items of this type are cleared.
+        """
+        if kind is None:
+            self.entries.clear()
+            self.removed.clear()
+        else:
+            for item in [item for item in self.entries if isinstance(item, kind)]:
+                del self.entries[item]
+                self.removed.discard(item)
+
+    def takePending(self):
+        """Returns and resets the items touched since the last call."""
+        pending, self.pending = list(self.pending), {}
+
+        return pending
+
+    def diff(self, kind=None):
+        """Builds a line diff of all dirty items.
+
+        Args:
+            kind (type): If given, only items of this type are included.
+
+        Returns:
+            A string in `difflib.ndiff` style, listing only items whose
+            rows actually differ from their clean state.
+        """
+        lines = []
+
+        for item, before in self.entries.items():
+            if kind is not None and not isinstance(item, kind):
+                continue
+
+            before = before or []
+            after = [] if item in self.removed else self.describe(item)
+
+            if before != after:
+                lines.extend(f'- {row}\n' for row in before)
+                lines.extend(f'+ {row}\n' for row in after)
+
+        return ''.join(lines)
@@ -0,0 +1,305 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+from fontTools.ttLib import TTFont
+
+from fontspecs import FontGeom, fetchFontSpec
+
+FONT_EXTENSIONS = ('.ttf', '.otf')
+
+# Bump when the layout of cached metrics changes
+CACHE_VERSION = 4
+
+# Subfamily names of the face used for a family's metrics
+REGULAR_STYLES = ('Regular', 'Roman', 'Normal', 'Book')
+
+class FontRegistry(object):
+    """Process-wide font registry.
+
+    Fonts are parsed at most once per process, and only when they are
+    first needed. Extracted metrics are persisted to a cache directory,
+    keyed by font path, modification time and size, so later sessions
+    do not need to parse the font at all. Qt fonts are registered on
+    first use instead of registering the whole font folder at startup.
+
+    Family lookups, including misses, are remembered for the session, so
+    the font folder is only walked again for families not seen before.
+
+    Args:
+        fontPath (str): Font folder.
+        cachePath (str): Metrics cache folder. If `None`, nothing is
+            persisted.
+
+    Attributes:
+        fontPath (str): Font folder.
+        cachePath (str): Metrics cache folder.
+    """
+
+    def __init__(self, fontPath, cachePath=None):
+        self.fontPath = fontPath
+        self.cachePath = cachePath
+
+        self._geoms = {}
+        self._qtFamilies = None
+        self._index = None
+        self._families = {}
+        self._resolved = {}
+
+    def resolve(self, name):
+        """Resolves a font file name relative to the font folder."""
+        if os.path.isabs(name):
+            return os.path.normpath(name)
+
+        return os.path.normpath(os.path.join(self.fontPath, name))
+
+    def geom(self, name, ptSize=12):
+        """Returns the shared `FontGeom` of a font file.
+
+        Args:
+            name (str): Font file name, relative to the font folder, or
+                an absolute path.
+            ptSize (int): Default point size of a newly created geometry.
+        """
+        path = self.resolve(name)
+
+        if path not in self._geoms:
+            fontSpec = self._loadSpec(path)
+            if fontSpec is None:
+                fontSpec = fetchFontSpec(path)
+                self._saveSpec(path, fontSpec)
+
+            self._geoms[path] = FontGeom(path, ptSize, fontSpec)
+
+        return self._geoms[path]
+
+    def geomForFamily(self, family, ptSize=12):
+        """Returns the shared `FontGeom` of a font family, if it is known."""
+        path = self.pathForFamily(family)
+
+        return self.geom(path, ptSize) if path else None
+
+    def pathForFamily(self, family):
+        """Looks up the font file of a family in the font folder,
+        preferring its regular face.
+        """
+        paths = self.pathsForFamily(family)
+
+        return paths[0] if paths else None
+
+    def pathsForFamily(self, family):
+        """Looks up all font files of a family in the font folder, e.g.
+        its regular, italic and bold faces, regular faces first.
+        """
+        if family not in self._resolved:
+            paths = self._lookup(family)
+            if paths is None:
+                # Fonts may have been added or changed since the index was built
+                self._buildIndex(self._loadIndex())
+                paths = self._lookup(family) or []
+
+            self._resolved[family] = paths
+
+        return self._resolved[family]
+
+    def registerQtFont(self, family):
+        """Registers a font family with Qt on first use.
+
+        Returns:
+            True if the family is available to Qt.
+        """
+        from PySide2 import QtGui
+
+        if self._qtFamilies is None:
+            self._qtFamilies = set(QtGui.QFontDatabase().families())
+
+        if family in self._qtFamilies:
+            return True
+
+        registered = False
+        for path in self.pathsForFamily(family):
+            fontId = QtGui.QFontDatabase.addApplicationFont(path)
+            if fontId != -1:
+                self._qtFamilies.update(QtGui.QFontDatabase.applicationFontFamilies(fontId))
+                registered = True
+
+        if registered:
+            self._qtFamilies.add(family)
+
+        return registered
+
+    @staticmethod
+    def _stamp(path):
+        stat = os.stat(path)
+
+        return [stat.st_mtime, stat.st_size]
+
+    def _lookup(self, family):
+        """Returns the indexed files of a family, or `None` if there are
+        none or any of them changed since they were indexed.
+        """
+        index = self._loadIndex()
+
+        paths = self._families.get(family)
+        if not paths:
+            return None
+
+        for path in paths:
+            if not os.path.exists(path) or self._stamp(path) != index[path]['stamp']:
+                return None
+
+        return list(paths)
+
+    def _mapFamilies(self, index):
+        families = {}
+        for path in sorted(index, key=lambda path: (not index[path]['regular'], path)):
+            for family in index[path]['families']:
+                families.setdefault(family, []).append(path)
+
+        self._families = families
+
+    def _indexPath(self):
+        return os.path.join(self.cachePath, 'index.json') if self.cachePath else None
+
+    def _loadIndex(self):
+        if self._index is None:
+            self._index = {}
+
+            indexPath = self._indexPath()
+            if indexPath and os.path.exists(indexPath):
+                try:
+                    with open(indexPath, encoding="utf8") as f:
+                        index = json.load(f)
+
+                    if index.get('version') == CACHE_VERSION:
+                        self._index = index['fonts']
+                except (OSError, ValueError, KeyError):
+                    pass
+
+            self._mapFamilies(self._index)
+
+        return self._index
+
+    def _buildIndex(self, index):
+        """Reads family names of new or changed fonts in the font folder."""
+        changed = False
+        found = set()
+
+        for root, _, files in os.walk(self.fontPath):
+            for fileName in files:
+                if not fileName.lower().endswith(FONT_EXTENSIONS):
+                    continue
+
+                path = os.path.normpath(os.path.join(root, fileName))
+                stamp = self._stamp(path)
+                found.add(path)
+
+                if path in index and index[path]['stamp'] == stamp:
+                    continue
+
+                try:
+                    # Only the name table is read
+                    font = TTFont(path, lazy=True)
+                    names = font['name'].names
+                    families = sorted(set(str(record) for record in names if record.nameID in (1, 16)))
+                    regular = any(str(record) in REGULAR_STYLES for record in names if record.nameID in (2, 17))
+                    font.close()
+                except Exception:
+                    families = []
+                    regular = False
+
+                index[path] = {'stamp' : stamp, 'families' : families, 'regular' : regular}
+                changed = True
+
+        # Drop fonts that were removed from the folder
+        for path in [path for path in index if path not in found]:
+            del index[path]
+            changed = True
+
+        if changed:
+            indexPath = self._indexPath()
+            if indexPath:
+                try:
+                    os.makedirs(self.cachePath, exist_ok=True)
+                    with open(indexPath, 'w', encoding="utf8") as f:
+                        json.dump({'version' : CACHE_VERSION, 'fonts' : index}, f)
+                except OSError:
+                    pass
+
+        self._mapFamilies(index)
+
+        return index
+
+    def _specPath(self, path):
+        key = hashlib.sha1(path.encode('utf-8')).hexdigest()
+
+        return os.path.join(self.cachePath, key + '.npz')
+
+    def _loadSpec(self, path):
+        if not self.cachePath:
+            return None
+
+        specPath = self._specPath(path)
+        if not os.path.exists(specPath):
+            return None
+
+        try:
+            with np.load(specPath) as data:
+                if int(data['version']) != CACHE_VERSION or list(data['stamp']) != self._stamp(path):
+                    return None
+
+                fontSpec = {
+                    'upm' : int(data['upm']),
+                    'advances' : data['advances'],
+                    'fallback' : dict(zip(data['fallbackCodes'].tolist(), data['fallbackAdvances'].tolist())),
+                    'notdef' : float(data['notdef']),
+                }
+
+                if 'ascender' in data:
+                    fontSpec.update({
+                        'ascender' : int(data['ascender']),
+                        'descender' : int(data['descender']),
+                        'lineGap' : int(data['lineGap']),
+                    })
+
+                if 'vadvances' in data:
+                    fontSpec.update({
+                        'vadvances' : data['vadvances'],
+                        'vfallback' : dict(zip(data['vfallbackCodes'].tolist(), data['vfallbackAdvances'].tolist())),
+                        'vnotdef' : float(data['vnotdef']),
+                    })
+
+                return fontSpec
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _saveSpec(self, path, fontSpec):
+        if not self.cachePath:
+            return
+
+        arrays = {
+            'version' : CACHE_VERSION,
+            'stamp' : np.array(self._stamp(path)),
+            'upm' : fontSpec['upm'],
+        }
+
+        for key in ('ascender', 'descender', 'lineGap'):
+            if key in fontSpec:
+                arrays[key] = fontSpec[key]
+
+        for prefix in ('', 'v'):
+            if prefix + 'advances' in fontSpec:
+                fallback = fontSpec[prefix + 'fallback']
+                arrays.update({
+                    prefix + 'advances' : fontSpec[prefix + 'advances'],
+                    prefix + 'fallbackCodes' : np.array(list(fallback.keys()), dtype=np.int64),
+                    prefix + 'fallbackAdvances' : np.array(list(fallback.values()), dtype=np.float64),
+                    prefix + 'notdef' : fontSpec[prefix + 'notdef'],
+                })
+
+        try:
+            os.makedirs(self.cachePath, exist_ok=True)
+            np.savez(self._specPath(path), **arrays)
+        except OSError:
+            pass
@@ -1,61 +1,146 @@
 from fontTools.ttLib import TTFont
 from fontTools.ttLib.tables._c_m_a_p import CmapSubtable
+import numpy as np
+
+# Code points below this limit are stored in a dense lookup table,
+# anything above it (rare CJK extensions, emoji) goes to a fallback dict.
+DENSE_LIMIT = 0x10000
 
 def fetchFontSpec(path):
-    font = TTFont(path)
+    # Tables are only parsed when accessed, and only cmap, head, hhea,
+    # hmtx and vmtx are needed for measuring text
+    font = TTFont(path, lazy=True)
     cmap = font['cmap']
     t = cmap.getcmap(3,1).cmap
-    s = font.getGlyphSet()
     unitsPerEm = font['head'].unitsPerEm
 
-    return {
+    spec = {
         'font' : font,
         't' : t,
-        's' : s,
         'upm' : unitsPerEm
     }
+    spec.update(buildAdvanceTable(t, font['hmtx'].metrics))
+
+    if 'hhea' in font:
+        hhea = font['hhea']
+        spec.update({
+            'ascender' : hhea.ascent,
+            'descender' : hhea.descent,
+            'lineGap' : hhea.lineGap
+        })
+
+    if 'vmtx' in font:
+        vertical = buildAdvanceTable(t, font['vmtx'].metrics)
+        spec.update({
+            'vadvances' : vertical['advances'],
+            'vfallback' : vertical['fallback'],
+            'vnotdef' : vertical['notdef']
+        })
+
+    return spec
+
+def buildAdvanceTable(t, metrics):
+    """Precomputes advance widths for all mapped code points.
+
+    Args:
+        t (dict): Code point to glyph name mapping.
+        metrics (dict): Glyph name to `(advance, bearing)` mapping.
+
+    Returns:
+        A dict with a dense `advances` array indexed by code point, a
+        `fallback` dict for code points beyond the dense range, and the
+        `.notdef` advance used for unmapped characters.
+    """
+    notdef = metrics['.notdef'][0] if '.notdef' in metrics else 0
+
+    dense = {c: metrics[g][0] for c, g in t.items() if c < DENSE_LIMIT and g in metrics}
+    fallback = {c: metrics[g][0] for c, g in t.items() if c >= DENSE_LIMIT and g in metrics}
+
+    advances = np.full(max(dense, default=-1) + 1, notdef, dtype=np.float64)
+    if dense:
+        advances[np.fromiter(dense.keys(), dtype=np.int64, count=len(dense))] = np.fromiter(dense.values(), dtype=np.float64, count=len(dense))
 
-def getCharDimensions(char, ptSize, fontSpec):
-    t = fontSpec['t']
-    s = fontSpec['s']
-    upm = fontSpec['upm']
+    return {
+        'advances' : advances,
+        'fallback' : fallback,
+        'notdef' : notdef
+    }
 
-    oc = ord(char)
-    if oc in t and t[oc] in s:
-        w = s[t[oc]].width
+def codePoints(text):
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+def lookupAdvances(codes, advances, fallback, notdef):
+    """Vectorized advance lookup for an array of code points."""
+    inTable = codes < len(advances)
+    if inTable.all():
+        return advances[codes]
+
+    widths = np.full(len(codes), notdef, dtype=np.float64)
+    widths[inTable] = advances[codes[inTable]]
+    for idx in np.flatnonzero(~inTable):
+        widths[idx] = fallback.get(int(codes[idx]), notdef)
+
+    return widths
+
+def measureLines(text, fontSpec, vertical=False):
+    """Returns the advance sum of each line of text, in font units.
+
+    Args:
+        text (str): Text, lines are separated by newlines.
+        fontSpec (dict): Font specification.
+        vertical (bool): If true, vertical advances are summed, so each
+            line is treated as a column of vertical text. Fonts without
+            vertical metrics fall back to one em per character.
+    """
+    codes = codePoints(text)
+    if len(codes) == 0:
+        return np.zeros(1)
+
+    if not vertical:
+        widths = lookupAdvances(codes, fontSpec['advances'], fontSpec['fallback'], fontSpec['notdef'])
+    elif 'vadvances' in fontSpec:
+        widths = lookupAdvances(codes, fontSpec['vadvances'], fontSpec['vfallback'], fontSpec['vnotdef'])
     else:
-        w = s['.notdef'].width
+        widths = np.full(len(codes), fontSpec['upm'], dtype=np.float64)
+
+    breaks = np.flatnonzero(codes == 0x0A)
+    if len(breaks) == 0:
+        return np.array([widths.sum()])
 
-    return [w*ptSize/upm, ptSize]
+    cumulative = np.concatenate(([0], np.cumsum(widths)))
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [len(codes)]))
 
-def getTextDimensions(text, ptSize, fontSpec, dim=[0,0]):
-    lines = text.split('\n')
+    return cumulative[ends] - cumulative[starts]
 
-    if len(lines) == 1:
-        w = 0
+def getCharDimensions(char, ptSize, fontSpec):
+    if not char:
+        return [0, ptSize]
 
-        t = fontSpec['t']
-        s = fontSpec['s']
-        upm = fontSpec['upm']
+    w = lookupAdvances(codePoints(char[:1]), fontSpec['advances'], fontSpec['fallback'], fontSpec['notdef'])[0]
 
-        for c in text:
-            oc = ord(c)
-            if oc in t and t[oc] in s:
-                w += s[t[oc]].width
-            else:
-                w += s['.notdef'].width
+    return [float(w)*ptSize/fontSpec['upm'], ptSize]
 
-        dim0_new = w*ptSize/upm
-        if dim0_new > dim[0]:
-            dim[0] = dim0_new
+def getTextDimensions(text, ptSize, fontSpec, dim=None):
+    if dim is None:
+        dim = [0,0]
+
+    lines = measureLines(text, fontSpec)
+
+    w = float(lines.max())*ptSize/fontSpec['upm']
+    if w > dim[0]:
+        dim[0] = w
+
+    dim[1] += ptSize*len(lines)
 
-        dim[1] += ptSize
-    else:
-        for line in lines:
-            dim = getTextDimensions(line, ptSize, fontSpec, dim)
-        
     return dim
 
+def getVerticalTextDimensions(text, ptSize, fontSpec):
+    """Returns the dimensions of vertical text, one column per line."""
+    columns = measureLines(text, fontSpec, vertical=True)
+
+    return [ptSize*len(columns), float(columns.max())*ptSize/fontSpec['upm']]
+
 HALF2FULLWIDTH = dict((i, i + 0xFEE0) for i in range(0x21, 0x7F))
 FULL2HALFWIDTH = dict((i + 0xFEE0, i) for i in range(0x21, 0x7F))
 
@@ -65,27 +150,74 @@ def half2fullWidth(txt:str):
 def full2halfWidth(txt:str):
     return txt.translate(FULL2HALFWIDTH)
 
+ASPECT_ORDERS = {
+    'w/h' : lambda w, h: w/h,
+    'h/w' : lambda w, h: h/w,
+}
+
+def aspectRatio(w, h, order='w/h'):
+    try:
+        return ASPECT_ORDERS[order](w, h)
+    except KeyError:
+        raise ValueError(f"Unknown aspect ratio order '{order}', expected one of {list(ASPECT_ORDERS)}")
+
 class FontGeom(object):
-    def __init__(self, path, ptSize=12):
+    def __init__(self, path, ptSize=12, fontSpec=None):
         self.path = path
-        self.fontSpec = fetchFontSpec(path)
+        self.fontSpec = fontSpec if fontSpec is not None else fetchFontSpec(path)
         self.ptSize = ptSize
 
     def getTextDimensions(self, text, ptSize=None):
         if not ptSize:
             ptSize = self.ptSize
 
-        return getTextDimensions(text, ptSize, self.fontSpec, [0,0])
+        return getTextDimensions(text, ptSize, self.fontSpec)
 
     def getTextWidth(self, text, ptSize=None):
-        self.getTextDimensions(text, ptSize)[0]
+        return self.getTextDimensions(text, ptSize)[0]
 
     def getTextHeight(self, text, ptSize=None):
-        self.getTextDimensions(text, ptSize)[1]
+        return self.getTextDimensions(text, ptSize)[1]
 
-    def getTextAspectRatio(self, text, ptSize=None, order='w/h'):
-        w, h = self.getTextDimensions(text, ptSize)
-        return eval(order)
+    @property
+    def unitsPerEm(self):
+        return self.fontSpec['upm']
+
+    def getAdvance(self, text):
+        """Returns the advance of a single line of text, in font units."""
+        return float(measureLines(text, self.fontSpec)[0])
+
+    def getLineHeight(self, ptSize=None):
+        """Returns the distance between two baselines.
+
+        Falls back to 1.2 times the point size for fonts without hhea.
+        """
+        if not ptSize:
+            ptSize = self.ptSize
+
+        if 'ascender' not in self.fontSpec:
+            return 1.2*ptSize
+
+        spec = self.fontSpec
+        return (spec['ascender'] - spec['descender'] + spec['lineGap'])*ptSize/spec['upm']
+
+    def getVerticalTextDimensions(self, text, ptSize=None):
+        if not ptSize:
+            ptSize = self.ptSize
+
+        return getVerticalTextDimensions(text, ptSize, self.fontSpec)
+
+    def getTextAspectRatio(self, text, ptSize=None, order='w/h', vertical=False):
+        if vertical:
+            w, h = self.getVerticalTextDimensions(text, ptSize)
+        else:
+            w, h = self.getTextDimensions(text, ptSize)
+
+        return aspectRatio(w, h, order)
+
+    @property
+    def hasVerticalMetrics(self):
+        return 'vadvances' in self.fontSpec
 
     def getCharDimensions(self, char, ptSize=None):
         if not ptSize:
@@ -94,8 +226,8 @@ class FontGeom(object):
         return getCharDimensions(char, ptSize, self.fontSpec)
 
     def getCharAspectRatio(self, char, ptSize=None, order='w/h'):
-        w, h = self.getTextDimensions(char, ptSize)
-        return eval(order)
+        w, h = self.getCharDimensions(char, ptSize)
+        return aspectRatio(w, h, order)
 
 if __name__ == "__main__":
     text = 'This is a test\nABCDEFGHIJKLMNOPQRSTUVW'
@@ -104,5 +236,3 @@ if __name__ == "__main__":
 
     fg = FontGeom('/Library/Fonts/Courier New.ttf', 12)
     print(fg.getTextDimensions(text))
-
-    
\ No newline at end of file
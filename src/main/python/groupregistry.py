@@ -0,0 +1,62 @@
+class GroupRegistry(object):
+    """Numbered bounding box groups of a page.
+
+    Groups are numbered in order of creation, starting at 1, unless
+    registered under an explicit number, e.g. when read from a box file.
+    Numbers of disbanded groups are not reused.
+
+    Lookups never add entries, and a registry only references the groups
+    of its own page, so dropping or clearing it releases them.
+    """
+
+    def __init__(self):
+        self._groups = {}
+        self.nextNumber = 1
+
+    def __len__(self):
+        return len(self._groups)
+
+    def __contains__(self, number):
+        return number in self._groups
+
+    def __iter__(self):
+        """Iterates over a snapshot of the groups, ordered by number."""
+        return iter([self._groups[number] for number in sorted(self._groups)])
+
+    def get(self, number):
+        """Returns the group with the given number, or `None`."""
+        return self._groups.get(number)
+
+    def items(self):
+        """Returns `(number, group)` pairs, ordered by number."""
+        return sorted(self._groups.items(), key=lambda item: item[0])
+
+    def register(self, group, number=None):
+        """Adds a group, and returns its number.
+
+        Args:
+            group (BoundingBoxGroup): Group to add.
+            number (int): Number to register the group under. The next
+                free number if `None`.
+
+        Raises:
+            ValueError: If the number is already taken.
+        """
+        if number is None:
+            number = self.nextNumber
+        elif number in self._groups:
+            raise ValueError(f'Group number {number} is already taken')
+
+        self._groups[number] = group
+        self.nextNumber = max(self.nextNumber, number + 1)
+
+        return number
+
+    def unregister(self, group):
+        """Removes a group, if registered under its number."""
+        if self._groups.get(group.number) is group:
+            del self._groups[group.number]
+
+    def clear(self):
+        self._groups.clear()
+        self.nextNumber = 1
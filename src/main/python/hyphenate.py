@@ -14,71 +14,132 @@
     This Python code is in the public domain.
 """
 
-import re
+import marshal
+import hashlib
+from functools import lru_cache
 
-__version__ = '1.0.20070709'
+__version__ = '1.1.20261019'
+
+# Bump when the compiled format changes
+COMPILED_VERSION = 2
+
+def parse_pattern(pattern):
+    """ Converts a pattern like 'a1bc3d4' into a string of chars 'abcd' and
+        a list of points [ 0, 1, 0, 3, 4 ].
+    """
+    chars = []
+    points = [0]
+    for c in pattern:
+        if c.isdigit():
+            points[-1] = int(c)
+        else:
+            chars.append(c)
+            points.append(0)
+    return ''.join(chars), points
+
+def parse_exception(exception):
+    """ Converts a hyphenated word like 'ta-ble' into its point array. """
+    points = [0, 0]
+    for c in exception:
+        if c == '-':
+            points[-1] = 1
+        else:
+            points.append(0)
+    return points
 
 class Hyphenator(object):
-    def __init__(self, patterns, exceptions=''):
+    """ Hyphenates words with Liang's algorithm.
+
+        Patterns are kept in a trie of nested dicts, one level per
+        character. A node that ends a pattern stores only its nonzero
+        points, as (offset, value) pairs under the `None` key, so most
+        nodes add nothing to the points of a word. The compiled form
+        serializes with marshal, so it can be loaded without parsing the
+        patterns again.
+    """
+    def __init__(self, patterns='', exceptions='', cache_size=4096):
         self.tree = {}
         for pattern in patterns.split():
             self._insert_pattern(pattern)
 
         self.exceptions = {}
         for ex in exceptions.split():
-            # Convert the hyphenated pattern into a point array for use later.
-            self.exceptions[ex.replace('-', '')] = [0] + [ int(h == '-') for h in re.split(r"[a-z]", ex) ]
+            self.exceptions[ex.replace('-', '')] = parse_exception(ex)
+
+        self._memo = lru_cache(maxsize=cache_size)(self._hyphenate_word)
 
     def _insert_pattern(self, pattern):
-        # Convert the a pattern like 'a1bc3d4' into a string of chars 'abcd'
-        # and a list of points [ 0, 1, 0, 3, 4 ].
-        chars = re.sub('[0-9]', '', pattern)
-        points = [ int(d or 0) for d in re.split("[.a-z]", pattern) ]
-
-        # Insert the pattern into the tree.  Each character finds a dict
-        # another level down in the tree, and leaf nodes have the list of
-        # points.
+        chars, points = parse_pattern(pattern)
+
         t = self.tree
         for c in chars:
-            if c not in t:
-                t[c] = {}
-            t = t[c]
-        t[None] = points
+            t = t.setdefault(c, {})
+        t[None] = tuple((j, p) for j, p in enumerate(points) if p)
+
+    def dumps(self):
+        """ Serializes the compiled patterns. """
+        return marshal.dumps((COMPILED_VERSION, self.tree, self.exceptions))
+
+    @classmethod
+    def loads(cls, data, cache_size=4096):
+        """ Loads compiled patterns serialized by `dumps`.
+
+            Raises ValueError if the data is not in the current format.
+        """
+        try:
+            version, *compiled = marshal.loads(data)
+        except (EOFError, TypeError, ValueError):
+            raise ValueError('Invalid compiled hyphenation patterns')
+
+        if version != COMPILED_VERSION:
+            raise ValueError(f'Compiled hyphenation patterns have version {version}, expected {COMPILED_VERSION}')
+
+        hyphenator = cls(cache_size=cache_size)
+        hyphenator.tree, hyphenator.exceptions = compiled
+        return hyphenator
 
     def hyphenate_word(self, word):
         """ Given a word, returns a list of pieces, broken at the possible
             hyphenation points.
         """
+        # Results are memoized, hand out copies
+        return list(self._memo(word))
+
+    def _hyphenate_word(self, word):
         # Short words aren't hyphenated.
         if len(word) <= 4:
-            return [word]
+            return (word,)
         # If the word is an exception, get the stored points.
         if word.lower() in self.exceptions:
             points = self.exceptions[word.lower()]
         else:
             work = '.' + word.lower() + '.'
             points = [0] * (len(work)+1)
+            tree = self.tree
             for i in range(len(work)):
-                t = self.tree
+                t = tree
                 for c in work[i:]:
-                    if c in t:
-                        t = t[c]
-                        if None in t:
-                            p = t[None]
-                            for j in range(len(p)):
-                                points[i+j] = max(points[i+j], p[j])
-                    else:
+                    t = t.get(c)
+                    if t is None:
                         break
+                    p = t.get(None)
+                    if p:
+                        for k, v in p:
+                            k += i
+                            if v > points[k]:
+                                points[k] = v
             # No hyphens in the first two chars or the last two.
             points[1] = points[2] = points[-2] = points[-3] = 0
 
         # Examine the points to build the pieces list.
-        pieces = ['']
-        for c, p in zip(word, points[2:]):
-            pieces[-1] += c
+        pieces = []
+        start = 0
+        for i, p in enumerate(points[2:len(word)+1]):
             if p % 2:
-                pieces.append('')
-        return pieces
+                pieces.append(word[start:i+1])
+                start = i+1
+        pieces.append(word[start:])
+        return tuple(pieces)
 
 patterns = (
 # Knuth and Liang's original hyphenation patterns from classic TeX.
@@ -507,11 +568,52 @@ presents project projects reci-procity re-cog-ni-zance ref-or-ma-tion
 ret-ri-bu-tion ta-ble
 """
 
-hyphenator = Hyphenator(patterns, exceptions)
-hyphenate_word = hyphenator.hyphenate_word
+_hyphenator = None
+
+def _builtin_key():
+    """ Identifies the built-in patterns in a cache file. """
+    return hashlib.sha1((patterns + exceptions).encode('utf-8')).hexdigest()
+
+def _load_builtin(cache_file):
+    try:
+        with open(cache_file, 'rb') as f:
+            key, data = marshal.load(f)
+        if key != _builtin_key():
+            return None
+        return Hyphenator.loads(data)
+    except (OSError, EOFError, TypeError, ValueError):
+        return None
+
+def _save_builtin(cache_file, hyphenator):
+    try:
+        with open(cache_file, 'wb') as f:
+            marshal.dump((_builtin_key(), hyphenator.dumps()), f)
+    except OSError:
+        pass
+
+def default_hyphenator(cache_file=None):
+    """ Returns the English hyphenator, compiling it on first use.
+
+        If `cache_file` is given, the compiled patterns are loaded from it
+        instead, and written to it when it is missing or out of date.
+    """
+    global _hyphenator
+    if _hyphenator is None:
+        if cache_file:
+            _hyphenator = _load_builtin(cache_file)
+        if _hyphenator is None:
+            _hyphenator = Hyphenator(patterns, exceptions)
+            if cache_file:
+                _save_builtin(cache_file, _hyphenator)
+    return _hyphenator
+
+def hyphenate_word(word):
+    """ Hyphenates a word with the English patterns.
 
-del patterns
-del exceptions
+        >>> hyphenate_word("hyphenation")
+        ['hy', 'phen', 'ation']
+    """
+    return default_hyphenator().hyphenate_word(word)
 
 if __name__ == '__main__':
     import sys
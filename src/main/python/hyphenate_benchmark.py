@@ -0,0 +1,104 @@
+""" Benchmarks `hyphenate` against its original implementation.
+
+    Times getting a hyphenator (building the trie at import before,
+    loading the compiled form now) and hyphenating words, with and
+    without the memo. Run with `python hyphenate_benchmark.py`.
+"""
+
+import re
+import sys
+import timeit
+
+import hyphenate
+from hyphenate import Hyphenator, patterns, exceptions
+
+class LegacyHyphenator(object):
+    """ The original nested-dict trie, with patterns parsed by regexes and
+        full point lists at every pattern node.
+    """
+    def __init__(self, patterns, exceptions=''):
+        self.tree = {}
+        for pattern in patterns.split():
+            self._insert_pattern(pattern)
+
+        self.exceptions = {}
+        for ex in exceptions.split():
+            self.exceptions[ex.replace('-', '')] = [0] + [ int(h == '-') for h in re.split(r"[a-z]", ex) ]
+
+    def _insert_pattern(self, pattern):
+        chars = re.sub('[0-9]', '', pattern)
+        points = [ int(d or 0) for d in re.split("[.a-z]", pattern) ]
+
+        t = self.tree
+        for c in chars:
+            if c not in t:
+                t[c] = {}
+            t = t[c]
+        t[None] = points
+
+    def hyphenate_word(self, word):
+        if len(word) <= 4:
+            return [word]
+        if word.lower() in self.exceptions:
+            points = self.exceptions[word.lower()]
+        else:
+            work = '.' + word.lower() + '.'
+            points = [0] * (len(work)+1)
+            for i in range(len(work)):
+                t = self.tree
+                for c in work[i:]:
+                    if c in t:
+                        t = t[c]
+                        if None in t:
+                            p = t[None]
+                            for j in range(len(p)):
+                                points[i+j] = max(points[i+j], p[j])
+                    else:
+                        break
+            points[1] = points[2] = points[-2] = points[-3] = 0
+
+        pieces = ['']
+        for c, p in zip(word, points[2:]):
+            pieces[-1] += c
+            if p % 2:
+                pieces.append('')
+        return pieces
+
+def benchmark(words=None, repeat=5):
+    """ Prints before and after timings.
+
+        Returns False if both implementations disagree on any word.
+    """
+    if words is None:
+        words = [word.strip('.,"()>') for word in hyphenate.__doc__.split()] * 50
+
+    legacy = LegacyHyphenator(patterns, exceptions)
+    data = Hyphenator(patterns, exceptions).dumps()
+    unmemoized = Hyphenator.loads(data, cache_size=0)
+    memoized = Hyphenator.loads(data)
+
+    mismatches = [word for word in set(words) if legacy.hyphenate_word(word) != memoized.hyphenate_word(word)]
+    if mismatches:
+        print(f'results differ on: {", ".join(sorted(mismatches))}')
+        return False
+
+    def best(func):
+        return min(timeit.repeat(func, number=1, repeat=repeat))
+
+    legacy_build = best(lambda: LegacyHyphenator(patterns, exceptions))
+    compile_time = best(lambda: Hyphenator(patterns, exceptions))
+    load_time = best(lambda: Hyphenator.loads(data))
+    legacy_words = best(lambda: [legacy.hyphenate_word(w) for w in words])
+    cold = best(lambda: [unmemoized.hyphenate_word(w) for w in words])
+    warm = best(lambda: [memoized.hyphenate_word(w) for w in words])
+
+    print(f'before, build trie: {legacy_build*1000:.2f} ms')
+    print(f'after, compile patterns: {compile_time*1000:.2f} ms')
+    print(f'after, load compiled ({len(data)} bytes): {load_time*1000:.2f} ms')
+    print(f'before, hyphenate: {legacy_words/len(words)*1e6:.2f} us/word')
+    print(f'after, hyphenate: {cold/len(words)*1e6:.2f} us/word')
+    print(f'after, hyphenate, memoized: {warm/len(words)*1e6:.2f} us/word')
+    return True
+
+if __name__ == '__main__':
+    sys.exit(0 if benchmark() else 1)
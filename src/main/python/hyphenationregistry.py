@@ -0,0 +1,184 @@
+import os
+import re
+import glob
+import marshal
+import hashlib
+
+from hyphenate import Hyphenator, default_hyphenator
+
+# Translation language codes that differ from hyph-utf8 pattern names
+ALIASES = {
+    'de' : 'de-1996',
+    'el' : 'el-monoton',
+    'en' : 'en-us',
+}
+
+TEX_BLOCK = re.compile(r'\\(patterns|hyphenation)\s*\{([^}]*)\}')
+TEX_COMMENT = re.compile(r'%.*')
+
+def noHyphenation(word):
+    return [word]
+
+def readTexPatterns(path):
+    """Reads a TeX hyphenation file.
+
+    Returns:
+        A tuple `(patterns, exceptions)` of whitespace separated strings.
+    """
+    with open(path, encoding="utf8") as f:
+        tex = TEX_COMMENT.sub('', f.read())
+
+    blocks = {'patterns' : [], 'hyphenation' : []}
+    for kind, block in TEX_BLOCK.findall(tex):
+        blocks[kind].append(block)
+
+    return ' '.join(blocks['patterns']), ' '.join(blocks['hyphenation'])
+
+class HyphenationRegistry(object):
+    """Per-language hyphenation registry.
+
+    Hyphenators are built on first use from TeX hyphenation pattern
+    files in the pattern folder, either `hyph-<lang>.tex` or the plain
+    `hyph-<lang>.pat.txt` (with an optional `hyph-<lang>.hyp.txt` of
+    exceptions), as distributed by hyph-utf8. Compiled patterns are
+    cached on disk, keyed by pattern file, modification time and size.
+    English falls back to the built-in patterns, whose compiled form is
+    cached as well.
+
+    Args:
+        patternPath (str): Pattern folder.
+        cachePath (str): Compiled pattern cache folder. If `None`,
+            nothing is persisted.
+
+    Attributes:
+        patternPath (str): Pattern folder.
+        cachePath (str): Compiled pattern cache folder.
+    """
+
+    def __init__(self, patternPath, cachePath=None):
+        self.patternPath = patternPath
+        self.cachePath = cachePath
+
+        self._hyphenators = {}
+
+    def hyphenator(self, language):
+        """Returns the hyphenator of a language, or `None` if unknown."""
+        language = language.lower()
+
+        if language not in self._hyphenators:
+            hyphenator = None
+
+            path = self.patternFile(language)
+            if path:
+                hyphenator = self._loadCompiled(path)
+                if hyphenator is None:
+                    hyphenator = self._compile(path)
+                    self._saveCompiled(path, hyphenator)
+            elif language.split('-')[0] == 'en':
+                hyphenator = default_hyphenator(self._builtinCacheFile())
+
+            self._hyphenators[language] = hyphenator
+
+        return self._hyphenators[language]
+
+    def hyphenate(self, language):
+        """Returns a function hyphenating words of a language.
+
+        Languages without patterns are not hyphenated.
+        """
+        hyphenator = self.hyphenator(language)
+
+        return hyphenator.hyphenate_word if hyphenator else noHyphenation
+
+    def patternFile(self, language):
+        """Looks up the pattern file of a language in the pattern folder."""
+        if not self.patternPath or not os.path.isdir(self.patternPath):
+            return None
+
+        base = language.split('-')[0]
+        names = [language, ALIASES.get(language), ALIASES.get(base), base]
+
+        for name in names:
+            if not name:
+                continue
+
+            for ext in ('.pat.txt', '.tex'):
+                path = os.path.join(self.patternPath, f'hyph-{name}{ext}')
+                if os.path.exists(path):
+                    return os.path.normpath(path)
+
+        # Any variant of the base language, e.g. hyph-pt-br for pt
+        for ext in ('.pat.txt', '.tex'):
+            paths = sorted(glob.glob(os.path.join(glob.escape(self.patternPath), f'hyph-{base}-*{ext}')))
+            if paths:
+                return os.path.normpath(paths[0])
+
+        return None
+
+    @staticmethod
+    def _compile(path):
+        if path.endswith('.pat.txt'):
+            with open(path, encoding="utf8") as f:
+                patterns = f.read()
+
+            exceptions = ''
+            exceptionPath = path[:-len('.pat.txt')] + '.hyp.txt'
+            if os.path.exists(exceptionPath):
+                with open(exceptionPath, encoding="utf8") as f:
+                    exceptions = f.read()
+        else:
+            patterns, exceptions = readTexPatterns(path)
+
+        return Hyphenator(patterns, exceptions)
+
+    @staticmethod
+    def _stamp(path):
+        stat = os.stat(path)
+
+        return [stat.st_mtime, stat.st_size]
+
+    def _cacheFile(self, path):
+        key = hashlib.sha1(path.encode('utf-8')).hexdigest()
+
+        return os.path.join(self.cachePath, key + '.hyph')
+
+    def _builtinCacheFile(self):
+        if not self.cachePath:
+            return None
+
+        try:
+            os.makedirs(self.cachePath, exist_ok=True)
+        except OSError:
+            return None
+
+        return os.path.join(self.cachePath, 'hyph-en-builtin.hyph')
+
+    def _loadCompiled(self, path):
+        if not self.cachePath:
+            return None
+
+        cacheFile = self._cacheFile(path)
+        if not os.path.exists(cacheFile):
+            return None
+
+        try:
+            with open(cacheFile, 'rb') as f:
+                stamp, data = marshal.load(f)
+
+            if stamp != self._stamp(path):
+                return None
+
+            return Hyphenator.loads(data)
+        except (OSError, EOFError, TypeError, ValueError):
+            return None
+
+    def _saveCompiled(self, path, hyphenator):
+        if not self.cachePath:
+            return
+
+        try:
+            os.makedirs(self.cachePath, exist_ok=True)
+            with open(self._cacheFile(path), 'wb') as f:
+                marshal.dump((self._stamp(path), hyphenator.dumps()), f)
+        except OSError:
+            pass
@@ -0,0 +1,136 @@
+"""Minimum-raggedness line breaking over lines of varying width.
+
+Text is given as a list of fragments: words, or pieces of words split at
+hyphenation points. Every fragment boundary is a possible break, and the
+kind of a fragment tells what happens at the boundary after it. Breaks
+are chosen by dynamic programming over `(line, fragment)` states, in the
+spirit of Knuth and Plass, minimizing the total squared relative slack of
+all lines plus a penalty per hyphenated line. Each line has its own
+width, which lets lines follow the outline of a bubble.
+
+A line can only grow until it is wider than its width, so every state
+only looks ahead a bounded number of fragments, and the whole search is
+linear in the number of fragments for a given number of lines.
+"""
+
+# Kinds of boundaries after a fragment
+SPACE = 0   # Between words, a space when not broken
+HYPHEN = 1  # Within a word, a hyphen when broken
+JOIN = 2    # Within a word without hyphenation, e.g. CJK
+FORCED = 3  # End of a paragraph, always broken
+
+class Fragment(object):
+    __slots__ = ('text', 'width', 'kind')
+
+    def __init__(self, text, width, kind):
+        self.text = text
+        self.width = width
+        self.kind = kind
+
+    def __repr__(self):
+        return f'Fragment({self.text!r}, {self.width}, {self.kind})'
+
+def breakLines(fragments, widths, space, hyphen, hyphenPenalty=0.1):
+    """Breaks fragments into exactly `len(widths)` lines.
+
+    Args:
+        fragments (list): List of `Fragment`. The last one must be
+            `FORCED`.
+        widths (list): Width of each line.
+        space (float): Width of a space.
+        hyphen (float): Width of a hyphen.
+        hyphenPenalty (float): Cost added for each line ending in a
+            hyphen, relative to a line that is entirely empty.
+
+    Returns:
+        The list of lines, or `None` if the fragments do not fit.
+    """
+    n = len(fragments)
+    if n == 0 or len(widths) == 0:
+        return None
+
+    # Running width of fragments[:j], including the glue after each one
+    prefix = [0.0]*(n + 1)
+    glue = [0.0]*n
+    extra = [0.0]*n
+    for j, fragment in enumerate(fragments):
+        if fragment.kind == SPACE:
+            glue[j] = space
+        elif fragment.kind == HYPHEN and not fragment.text.endswith('-'):
+            extra[j] = hyphen
+        prefix[j + 1] = prefix[j] + fragment.width + glue[j]
+
+    # Width left over the remaining lines. The text after a break can only
+    # lose the spaces at the remaining breaks, so breaks leaving more than
+    # that are dead ends.
+    remaining = [0.0]*(len(widths) + 1)
+    for k in range(len(widths) - 1, -1, -1):
+        remaining[k] = remaining[k + 1] + widths[k] + space
+
+    if prefix[n] > remaining[0]:
+        return None
+
+    costs = {0 : 0.0}
+    back = []
+
+    for line, width in enumerate(widths):
+        if width <= 0:
+            return None
+
+        nextCosts = {}
+        pointers = {}
+        capacity = remaining[line + 1]
+
+        for i, cost in costs.items():
+            for j in range(i + 1, n + 1):
+                base = prefix[j] - prefix[i] - glue[j - 1]
+                if base > width:
+                    break
+
+                kind = fragments[j - 1].kind
+                lineWidth = base + extra[j - 1]
+
+                if lineWidth <= width and prefix[n] - prefix[j] <= capacity:
+                    slack = (width - lineWidth)/width
+                    lineCost = cost + slack*slack
+                    if kind == HYPHEN:
+                        lineCost += hyphenPenalty
+
+                    if lineCost < nextCosts.get(j, float('inf')):
+                        nextCosts[j] = lineCost
+                        pointers[j] = i
+
+                if kind == FORCED:
+                    break
+
+        if not nextCosts:
+            return None
+
+        costs = nextCosts
+        back.append(pointers)
+
+    if n not in costs:
+        return None
+
+    # Walk the breaks back from the end
+    breaks = [n]
+    for pointers in reversed(back[1:]):
+        breaks.append(pointers[breaks[-1]])
+    breaks.append(0)
+    breaks.reverse()
+
+    lines = []
+    for i, j in zip(breaks, breaks[1:]):
+        line = []
+        for k in range(i, j):
+            fragment = fragments[k]
+            line.append(fragment.text)
+            if k < j - 1 and fragment.kind == SPACE:
+                line.append(' ')
+
+        if extra[j - 1]:
+            line.append('-')
+
+        lines.append(''.join(line))
+
+    return lines
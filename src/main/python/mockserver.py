@@ -0,0 +1,308 @@
+import json
+import time
+import random
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+def syntheticTranslation(text):
+    """Deterministic stand-in translation. Keeps segment delimiters."""
+    return text.upper()
+
+def googleWebResponse(translation, source='ja', target='en'):
+    """Builds a response in the layout of the Google Translate web RPC."""
+    inner = [[None, None, source], [[[None, None, None, None, None, [[translation, None, None, None, [[translation, []]]]]]], target]]
+    chunk = json.dumps([["wrb.fr", "MkEWBc", json.dumps(inner), None, None, None, "generic"]])
+
+    # The length counts the newline ending the chunk
+    return f")]}}'\n\n{len(chunk) + 1}\n{chunk}\n"
+
+def parseGoogleWebRequest(body):
+    """Extracts `(query, source, target)` from a web RPC request body."""
+    req = json.loads(parse_qs(body)['f.req'][0])
+    query, source, target, _ = json.loads(req[0][0][1])[0]
+
+    return query, source, target
+
+class MockServer(object):
+    """Local translation server for offline tests and benchmarks.
+
+    Serves the endpoints of every translator backend. Requests are
+    answered from recorded exchanges where possible, and otherwise with
+    synthetic translations (upper-cased text) in the backend's response
+    layout. Latency and failures can be injected to exercise retries and
+    rate limiting. With an upstream URL, requests are proxied instead and
+    the exchanges recorded, to be replayed later.
+
+    Args:
+        recordings (str): JSON lines file of recorded exchanges to replay.
+        delay (float): Delay in seconds added to every response.
+        failRate (float): Share of requests, between 0 and 1, answered
+            with a 503 error.
+        synthetic (bool): If true, requests without a recording get a
+            synthetic translation, otherwise a 404 error.
+        upstream (str): Service URL to proxy requests to.
+        recordPath (str): JSON lines file proxied exchanges are appended
+            to.
+        port (int): Port to listen on. Any free port if 0.
+
+    Attributes:
+        requests (int): Number of requests served.
+        failures (int): Number of injected failures.
+    """
+
+    def __init__(self, recordings=None, delay=0, failRate=0, synthetic=True, upstream=None, recordPath=None, port=0, seed=None):
+        self.delay = delay
+        self.failRate = failRate
+        self.synthetic = synthetic
+        self.upstream = upstream.rstrip('/') if upstream else None
+        self.recordPath = recordPath
+        self.port = port
+
+        self.requests = 0
+        self.failures = 0
+
+        self._exact = {}
+        self._byPath = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+        if recordings:
+            self.loadRecordings(recordings)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+
+        return f'http://{host}:{port}'
+
+    def loadRecordings(self, path):
+        with open(path, encoding="utf8") as f:
+            for line in f:
+                if line.strip():
+                    self.addRecording(json.loads(line))
+
+    def addRecording(self, record):
+        """Adds an exchange, a dict with `method`, `path`, `body`, `status`,
+        `headers` and `text`.
+        """
+        path = urlsplit(record['path']).path
+        self._exact[(record['method'], path, record.get('body', ''))] = record
+        self._byPath.setdefault((record['method'], path), []).append(record)
+
+    def start(self):
+        """Starts serving on a background thread."""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server._handle(self, 'GET')
+
+            def do_POST(self):
+                server._handle(self, 'POST')
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        with self._lock:
+            return {'requests' : self.requests, 'failures' : self.failures}
+
+    def _handle(self, handler, method):
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length).decode('utf-8') if length else ''
+        path = urlsplit(handler.path).path
+
+        if path == '/_stats':
+            return self._send(handler, 200, json.dumps(self.stats()), 'application/json')
+
+        with self._lock:
+            self.requests += 1
+            fail = self.failRate and self._random.random() < self.failRate
+            if fail:
+                self.failures += 1
+
+        if self.delay:
+            time.sleep(self.delay)
+
+        if fail:
+            return self._send(handler, 503, 'Injected failure')
+
+        if self.upstream:
+            return self._proxy(handler, method, body)
+
+        record = self._replay(method, path, body)
+        if record is not None:
+            return self._send(handler, record.get('status', 200), record['text'], record.get('headers', {}).get('Content-Type'))
+
+        if self.synthetic:
+            try:
+                status, text, contentType = self._synthesize(path, handler.path, body)
+            except (ValueError, LookupError, TypeError):
+                status, text, contentType = 400, 'Malformed request', None
+
+            return self._send(handler, status, text, contentType)
+
+        return self._send(handler, 404, 'No recording')
+
+    def _replay(self, method, path, body):
+        with self._lock:
+            record = self._exact.get((method, path, body))
+            if record is None:
+                records = self._byPath.get((method, path))
+                if records:
+                    # Round-robin over exchanges recorded for the path
+                    record = records.pop(0)
+                    records.append(record)
+
+        return record
+
+    def _synthesize(self, path, fullPath, body):
+        if path.endswith('/batchexecute'):
+            query, source, target = parseGoogleWebRequest(body)
+            return 200, googleWebResponse(syntheticTranslation(query), 'ja' if source == 'auto' else source, target), 'application/json; charset=utf-8'
+
+        if path == '/language/translate/v2':
+            if 'key' not in parse_qs(urlsplit(fullPath).query):
+                return 403, json.dumps({'error' : {'code' : 403, 'message' : 'Missing API key'}}), 'application/json'
+
+            req = json.loads(body)
+            queries = req['q'] if isinstance(req['q'], list) else [req['q']]
+            translations = [{'translatedText' : syntheticTranslation(q)} for q in queries]
+            if not req.get('source'):
+                for translation in translations:
+                    translation['detectedSourceLanguage'] = 'ja'
+
+            return 200, json.dumps({'data' : {'translations' : translations}}), 'application/json'
+
+        if path == '/translate':
+            req = json.loads(body)
+            if isinstance(req['q'], list):
+                data = {'translatedText' : [syntheticTranslation(q) for q in req['q']]}
+                detected = [{'confidence' : 90, 'language' : 'ja'} for q in req['q']]
+            else:
+                data = {'translatedText' : syntheticTranslation(req['q'])}
+                detected = {'confidence' : 90, 'language' : 'ja'}
+
+            if req.get('source') == 'auto':
+                data['detectedLanguage'] = detected
+
+            return 200, json.dumps(data), 'application/json'
+
+        return 404, 'Unknown endpoint', None
+
+    def _proxy(self, handler, method, body):
+        headers = {'Content-Type' : handler.headers.get('Content-Type', 'application/x-www-form-urlencoded')}
+
+        try:
+            r = requests.request(method, self.upstream + handler.path, data=body.encode('utf-8'), headers=headers, timeout=30)
+        except requests.RequestException as e:
+            return self._send(handler, 502, str(e))
+
+        contentType = r.headers.get('Content-Type')
+        if self.recordPath:
+            record = {
+                'method' : method,
+                'path' : handler.path,
+                'body' : body,
+                'status' : r.status_code,
+                'headers' : {'Content-Type' : contentType},
+                'text' : r.text,
+            }
+
+            with self._lock:
+                with open(self.recordPath, 'a', encoding="utf8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+        self._send(handler, r.status_code, r.text, contentType)
+
+    @staticmethod
+    def _send(handler, status, text, contentType=None):
+        data = text.encode('utf-8')
+
+        handler.send_response(status)
+        handler.send_header('Content-Type', contentType or 'text/plain; charset=utf-8')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+def benchmark(backend='google-web', segments=200, pages=10, concurrency=4, delay=0.01, failRate=0, rateLimit=None):
+    """Translates synthetic pages against a mock server.
+
+    Returns:
+        A dict with the number of requests and retries, the time taken
+        and the throughput in segments per second.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from translator import createTranslator
+
+    texts = [[f'セリフ {page}-{i} です' for i in range(segments)] for page in range(pages)]
+
+    with MockServer(delay=delay, failRate=failRate, seed=0) as server:
+        with createTranslator(backend, service_urls=[server.url], api_key='mock', rate_limit=rateLimit, backoff=0.01, retries=5) as translator:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(translator.translateBatch, texts))
+            elapsed = time.perf_counter() - start
+
+        stats = server.stats()
+
+    assert all(result == [syntheticTranslation(text) for text in page] for result, page in zip(results, texts))
+
+    return {
+        'requests' : stats['requests'],
+        'retries' : stats['failures'],
+        'seconds' : elapsed,
+        'segments/s' : segments*pages/elapsed,
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serves or benchmarks mock translation backends.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--recordings')
+    parser.add_argument('--record')
+    parser.add_argument('--upstream')
+    parser.add_argument('--delay', type=float, default=0)
+    parser.add_argument('--fail-rate', type=float, default=0)
+    parser.add_argument('--benchmark', action='store_true')
+    parser.add_argument('--backend', default='google-web')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        result = benchmark(args.backend, delay=args.delay, failRate=args.fail_rate)
+        print(', '.join(f'{key}: {value:.1f}' if isinstance(value, float) else f'{key}: {value}' for key, value in result.items()))
+    else:
+        server = MockServer(args.recordings, args.delay, args.fail_rate, upstream=args.upstream, recordPath=args.record, port=args.port).start()
+        print(f'Serving on {server.url}')
+
+        try:
+            server._thread.join()
+        except KeyboardInterrupt:
+            server.stop()
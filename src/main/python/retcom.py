@@ -2,8 +2,11 @@ import sys
 import os
 import subprocess
 import json
-from collections import defaultdict
+import io
 import difflib
+import itertools
+from array import array
+from collections import defaultdict
 import uuid
 
 # import fs
@@ -16,7 +19,17 @@ from PySide2 import QtCore, QtWidgets, QtGui
 
 from parse_lstmbox import LSTMBox
 from fontspecs import FontGeom, full2halfWidth, half2fullWidth
-from translator import Translator
+from fontregistry import FontRegistry
+from translator import Translator, TranslationError, createTranslator
+from translationscheduler import TranslationScheduler, archivePages, loadTranslations
+from translationmemory import TranslationMemory
+from changejournal import ChangeJournal
+from sceneindex import SceneIndex
+from groupregistry import GroupRegistry
+from boxlist import BoxList
+from autosave import EditLog
+from bubblelayout import BubbleLayout
+from hyphenationregistry import HyphenationRegistry
 from imagetools import *
 
 from PIL import Image, ImageDraw, ImageQt
@@ -49,15 +62,53 @@ class RetComConfig(object):
         fullWidth (bool): If true, half-width characters are
             automatically treated as full-width CJK characters. Defaults
             to `True`.
-        changeCheckThreshold (int): File size threshold for change
-            checking. If the file size exceeds the threshold, no checks
-            are performed, and a warning dialog is always shown on exit.
-            Defaults to 7 KB.
         fontPath (str): Relative font path location. Defaults to
             `fonts`.
         font (str): Default font name used in font size detection.
             Defaults to `GenEiAntiquePv5-M.ttf`.
+        fontCachePath (str): Folder in which extracted font metrics are
+            cached. Defaults to the platform cache location.
         boxPath (str): Relative box path location. Defaults to `box`.
+        boxLayer (bool): If true, unselected bounding boxes are painted
+            together by a single scene item instead of one by one, which
+            keeps panning and zooming smooth on heavily annotated pages.
+            Defaults to `False`.
+        autosave (bool): If true, scene edits are journaled next to the
+            box files so a session can be recovered after a crash.
+            Defaults to `True`.
+        autosaveInterval (int): Interval in milliseconds at which edits
+            are handed to the journal writer. Defaults to 1000.
+        autosaveCompactThreshold (int): Number of journal records after
+            which the journal is compacted into autosave sidecars.
+            Defaults to 500.
+        translationBackend (str): Translation backend, one of
+            `google-web`, `google-cloud` or `libretranslate`. Defaults to
+            `google-web`.
+        translationServiceUrls (list): Hosts or URLs of the translation
+            service, tried in order. Defaults to the backend's public
+            service.
+        translationApiKey (str): API key of the translation backend, if
+            it needs one. Defaults to `None`.
+        translationConcurrency (int): Number of pages translated at once
+            when translating a whole archive. Defaults to 4.
+        translationRateLimit (float): Maximum number of translation
+            requests per second. Defaults to 5.
+        translationMemorySize (int): Number of translations kept in the
+            local translation memory. The memory is disabled if 0.
+            Defaults to 20000.
+        translationMemoryFuzziness (float): Minimum similarity, between 0
+            and 1, at which a remembered translation of a slightly
+            different source is reused. Disabled if 0. Defaults to 0.
+        hyphenationPath (str): Relative location of TeX hyphenation
+            patterns (`hyph-<lang>.tex` or `hyph-<lang>.pat.txt`). Bubble
+            text is hyphenated with the patterns of the translation
+            language. Defaults to `hyphenation`.
+        bubbleLineSpacing (float): Line height multiplier used when
+            fitting text to bubbles. Defaults to 1.0.
+        bubbleMinFontSize (int): Smallest font size in pixels tried when
+            fitting text to bubbles. Defaults to 8.
+        bubbleMaxFontSize (int): Largest font size in pixels tried when
+            fitting text to bubbles. Defaults to 100.
     """
 
     def __init__(self, path:str='./config/config.json'):
@@ -71,15 +122,25 @@ class RetComConfig(object):
 
         self.language = self.json.get('language') if self.json.get('language') else 'jpn_vert'
         self.translationLanguage = self.json.get('translationLanguage') if self.json.get('translationLanguage') else 'en'
+        self.translationBackend = self.json.get('translationBackend') if self.json.get('translationBackend') else 'google-web'
+        self.translationServiceUrls = self.json.get('translationServiceUrls') if self.json.get('translationServiceUrls') else None
+        self.translationApiKey = self.json.get('translationApiKey') if self.json.get('translationApiKey') else None
+        self.translationConcurrency = int(self.json.get('translationConcurrency')) if self.json.get('translationConcurrency') else 4
+        self.translationRateLimit = float(self.json.get('translationRateLimit')) if self.json.get('translationRateLimit') else 5
+        self.translationMemorySize = int(self.json.get('translationMemorySize')) if (self.json.get('translationMemorySize') is not None) else 20000
+        self.translationMemoryFuzziness = float(self.json.get('translationMemoryFuzziness')) if self.json.get('translationMemoryFuzziness') else 0
+        self._translationMemory = None
         self.isVertical = self.json.get('isVertical') if (self.json.get('isVertical') is not None) else True
         self.doPrescan = self.json.get('doPrescan') if (self.json.get('doPrescan') is not None) else True
         self.fullWidth = self.json.get('fullWidth') if (self.json.get('fullWidth') is not None) else True
 
-        self.changeCheckThreshold = int(self.json.get('changeCheckThreshold')) if self.json.get('changeCheckThreshold') else int(7e3)
-
         self.fontPath = self.json.get('fontPath') if self.json.get('fontPath') else 'fonts'
         self.font = self.json.get('font') if self.json.get('font') else 'GenEiAntiquePv5-M.ttf'
+        self.fontCachePath = self.json.get('fontCachePath') if self.json.get('fontCachePath') else None
+        self._fontRegistry = None
+        self._qtFonts = {}
         self.boxPath = self.json.get('boxPath') if self.json.get('boxPath') else 'box'
+        self.boxLayer = self.json.get('boxLayer') if (self.json.get('boxLayer') is not None) else False
 
         self.suspiciousAspectRatio = self.json.get('suspiciousAspectRatio') if self.json.get('suspiciousAspectRatio') else 2
         self.scaleMultiplier = self.json.get('scaleMultiplier') if self.json.get('scaleMultiplier') else 0.1
@@ -130,8 +191,92 @@ class RetComConfig(object):
 
         self.inpaintMethod = eval(f"cv2.INPAINT_{self.json.get('inpaintMethod').upper()}") if self.json.get('inpaintMethod') else cv2.INPAINT_TELEA
 
+        self.autosave = self.json.get('autosave') if (self.json.get('autosave') is not None) else True
+        self.autosaveInterval = int(self.json.get('autosaveInterval')) if self.json.get('autosaveInterval') else 1000
+        self.autosaveCompactThreshold = int(self.json.get('autosaveCompactThreshold')) if self.json.get('autosaveCompactThreshold') else 500
+
+        self.bubbleLineSpacing = float(self.json.get('bubbleLineSpacing')) if self.json.get('bubbleLineSpacing') else 1.0
+        self.bubbleMinFontSize = int(self.json.get('bubbleMinFontSize')) if self.json.get('bubbleMinFontSize') else 8
+        self.bubbleMaxFontSize = int(self.json.get('bubbleMaxFontSize')) if self.json.get('bubbleMaxFontSize') else 100
+        self._bubbleLayouts = {}
+
+        self.hyphenationPath = self.json.get('hyphenationPath') if self.json.get('hyphenationPath') else 'hyphenation'
+        self._hyphenationRegistry = None
+
         self.debug = self.json.get('debug') if (self.json.get('debug') is not None) else False
 
+    @property
+    def fontRegistry(self) -> FontRegistry:
+        """Font registry shared by all windows using this configuration.
+
+        Created on first access, since the font path is usually adjusted
+        after the configuration has been read.
+        """
+        if self._fontRegistry is None:
+            cachePath = self.fontCachePath
+            if not cachePath:
+                cachePath = os.path.join(self.cacheLocation(), 'fonts')
+
+            self._fontRegistry = FontRegistry(self.fontPath, cachePath)
+
+        return self._fontRegistry
+
+    def qtFont(self, family:str, pixelSize:int) -> QtGui.QFont:
+        """Returns a font shared by all items using the same family and
+        size. Fonts are registered with Qt on first use.
+
+        The returned font must not be modified.
+        """
+        key = (family, pixelSize)
+        if key not in self._qtFonts:
+            self.fontRegistry.registerQtFont(family)
+
+            font = QtGui.QFont(family)
+            font.setPixelSize(pixelSize)
+            self._qtFonts[key] = font
+
+        return self._qtFonts[key]
+
+    @property
+    def translationMemory(self) -> TranslationMemory:
+        """Translation memory, or `None` if disabled."""
+        if self._translationMemory is None and self.translationMemorySize:
+            path = os.path.join(self.cacheLocation(), 'translation-memory.json')
+            self._translationMemory = TranslationMemory(path, self.translationMemorySize, self.translationMemoryFuzziness)
+
+        return self._translationMemory
+
+    def createTranslator(self) -> Translator:
+        """Creates a translator for the configured backend."""
+        return createTranslator(self.translationBackend, service_urls=self.translationServiceUrls, api_key=self.translationApiKey, rate_limit=self.translationRateLimit, memory=self.translationMemory)
+
+    @property
+    def hyphenationRegistry(self) -> HyphenationRegistry:
+        """Hyphenation registry, loading pattern files on first use."""
+        if self._hyphenationRegistry is None:
+            self._hyphenationRegistry = HyphenationRegistry(self.hyphenationPath, os.path.join(self.cacheLocation(), 'hyphenation'))
+
+        return self._hyphenationRegistry
+
+    @property
+    def bubbleLayout(self) -> BubbleLayout:
+        """Layout engine used to fit text to bubbles.
+
+        Text is hyphenated for the current translation language. Layouts
+        are shared between bubbles, so word measurements are cached
+        across the whole session.
+        """
+        language = self.translationLanguage
+        if language not in self._bubbleLayouts:
+            hyphenate = self.hyphenationRegistry.hyphenate(language)
+            self._bubbleLayouts[language] = BubbleLayout(hyphenate=hyphenate, lineSpacing=self.bubbleLineSpacing, minSize=self.bubbleMinFontSize, maxSize=self.bubbleMaxFontSize)
+
+        return self._bubbleLayouts[language]
+
+    @staticmethod
+    def cacheLocation():
+        return QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.CacheLocation)
+
     @staticmethod
     def hex2int(s:str):
         """Hex to integer support method.
@@ -176,8 +321,27 @@ class RetCom(QtWidgets.QMainWindow):
 
         self.clickChanged = False
         self.editItem = None
-        self.bboxes = []
+        self.bboxes = BoxList()
         self.bells = []
+        self.groups = GroupRegistry()
+
+        # Boxes, groups and ellipses currently in the scene
+        self.sceneIndex = SceneIndex()
+        # Selected items as of the last selection change, without items
+        # that left the scene since
+        self.selection = set()
+
+        self.journal = ChangeJournal(self.describeItem)
+        self.autosave:EditLog = None
+        self.autosaveTimer = QtCore.QTimer(self)
+        self.autosaveTimer.timeout.connect(self.flushAutosave)
+
+        # Groups whose bounds are stale, refreshed on the next tick
+        self.staleGroups = set()
+        self.groupShapeTimer = QtCore.QTimer(self)
+        self.groupShapeTimer.setSingleShot(True)
+        self.groupShapeTimer.setInterval(0)
+        self.groupShapeTimer.timeout.connect(self.flushGroupShapes)
 
         _, tail = os.path.split(self.imagePath)
 
@@ -186,6 +350,7 @@ class RetCom(QtWidgets.QMainWindow):
         self.createUI()
         self.createMenu()
 
+        self.boxModel = BoundingBoxModel(self)
         self.bboxSettings = BoundingBoxSettings(self)
         self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.bboxSettings)
         self.bboxSettings.setFloating(True)
@@ -249,9 +414,10 @@ class RetCom(QtWidgets.QMainWindow):
             # print(retcomconfig.fontPath)
             # print(retcomconfig.boxPath)
             # print(os.path.join(retcomconfig.fontPath, 'GenEiAntiquePv5-M.ttf'))
-            retcom.fontGeom = FontGeom(os.path.normpath(os.path.join(retcomconfig.fontPath, retcomconfig.font)))
+            retcom.fontGeom = retcomconfig.fontRegistry.geom(retcomconfig.font)
             # retcom.verticalText = False
-            if retcomconfig.doPrescan:
+            recovered = retcom.startAutosave()
+            if retcomconfig.doPrescan and not recovered:
                 retcom.parseLSTMBox(runTesseract(path, retcomconfig.tessdataPath, lang=lang, relPath=retcomconfig.boxPath))
 
             retcom.show()
@@ -266,6 +432,9 @@ class RetCom(QtWidgets.QMainWindow):
         self.imagePixmapItem = self.scene.addPixmap(self.image)
         self.imagePixmapItem.setZValue(-2)
 
+        # Joins the scene once it layers a box
+        self.boxLayer = BoxLayer(self)
+
         # self.simpleText = QtWidgets.QGraphicsSimpleTextItem('None')
         # self.simpleText = QtWidgets.QGraphicsTextItem(None)
         # self.simpleText.setHtml("<span style='background-color:white;color:black;'>None</span>")
@@ -359,6 +528,16 @@ class RetCom(QtWidgets.QMainWindow):
         prescanAction.setStatusTip('Prescans the current page')
         prescanAction.triggered.connect(self.prescanEvent)
 
+        translateArchiveAction = QtWidgets.QAction('Translate Archive', self)
+        translateArchiveAction.setShortcut('Ctrl+Alt+T')
+        translateArchiveAction.setStatusTip('Translates all pages of an archive')
+        translateArchiveAction.triggered.connect(self.translateArchiveEvent)
+
+        typesetPageAction = QtWidgets.QAction('Typeset Page', self)
+        typesetPageAction.setShortcut('Ctrl+Shift+T')
+        typesetPageAction.setStatusTip('Typesets group translations into bubbles')
+        typesetPageAction.triggered.connect(self.typesetPageEvent)
+
         infoAction = QtWidgets.QAction('Open Information', self)
         infoAction.setShortcut('Ctrl+I')
         infoAction.setStatusTip('Info on the current page')
@@ -366,11 +545,18 @@ class RetCom(QtWidgets.QMainWindow):
 
         self.editMenu = menubar.addMenu('&Edit')
         self.editMenu.addAction(translatePageAction)
+        self.editMenu.addAction(translateArchiveAction)
+        self.editMenu.addAction(typesetPageAction)
         self.editMenu.addAction(prescanAction)
         self.editMenu.addAction(infoAction)
 
 
     def exportLSTMBoxEvent(self):
+        """Asks for a path and exports the LSTMBox file there.
+
+        Returns:
+            True if a file was written, False if the dialog was cancelled.
+        """
         head, tail = os.path.split(self.imagePath)
         boxPathDir = os.path.join(head, self.retcomconfig.boxPath)
         boxPath = os.path.normpath(os.path.join(boxPathDir, tail))
@@ -378,6 +564,9 @@ class RetCom(QtWidgets.QMainWindow):
         path, _ = QtWidgets.QFileDialog.getSaveFileName(parent=None, caption='Export lstmbox', dir=boxPath+'.py.box', filter="Box files (*.box *.py.box)")
         if path != '':
             self.exportLSTMBox(path)
+            return True
+
+        return False
 
     def exportTXTEllEvent(self):
         head, tail = os.path.split(self.imagePath)
@@ -477,7 +666,7 @@ class RetCom(QtWidgets.QMainWindow):
 
         self.hideSelected()
 
-        for _, group in BoundingBoxGroup.groups[self.scene].items():
+        for group in self.groups:
             group.hide()
 
         self.scene.clearSelection()
@@ -547,23 +736,340 @@ class RetCom(QtWidgets.QMainWindow):
         self.translationDialog.adjustSize()
         self.translationDialog.show()
 
+    def translateArchiveEvent(self):
+        head, _ = os.path.split(self.imagePath)
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(parent=None, caption='Choose archive', dir=head, filter="Archives (*.zip *.cbz *.rar *.cbr)")
+        if path == '':
+            return
+
+        config = self.retcomconfig
+        scheduler = TranslationScheduler(self.translator, config.translationLanguage, concurrency=config.translationConcurrency, collationString=config.collationString)
+        try:
+            pages = archivePages(path, config.boxPath)
+        except (OSError, zipfile.BadZipFile, rarfile.Error) as e:
+            QtWidgets.QMessageBox.warning(self, 'Translate Archive', f'The archive could not be read.\n\n{e}')
+            return
+
+        scheduler.start(pages)
+
+        progress = QtWidgets.QProgressDialog('Translating pages...', 'Cancel', 0, scheduler.total, self)
+        progress.setWindowTitle('Translate Archive')
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        progress.canceled.connect(scheduler.cancel)
+
+        # Workers run in the background, progress is polled from the GUI thread
+        timer = QtCore.QTimer(progress)
+
+        def poll():
+            progress.setValue(scheduler.done)
+            if scheduler.done < scheduler.total:
+                return
+
+            timer.stop()
+            progress.close()
+            self.loadTranslations()
+
+            if self.translator.memory is not None:
+                self.translator.memory.save()
+
+            if scheduler.errors:
+                errors = '\n'.join(f'{name}: {error}' for name, error in scheduler.errors.items())
+                QtWidgets.QMessageBox.warning(self, 'Translate Archive', f'{len(scheduler.errors)} of {scheduler.total} pages failed.\n\n{errors}')
+
+        timer.timeout.connect(poll)
+        timer.start(200)
+
+    def loadTranslations(self):
+        """Hands translations stored for this page to its groups."""
+        translations = loadTranslations(self.sidecarBasePath(), self.retcomconfig.translationLanguage)
+
+        for n, translation in translations.items():
+            group = self.groups.get(n)
+            if group and not group.translation:
+                group.translation = translation
+
+    def typesetPageEvent(self):
+        typeset, overflowing = self.typesetPage()
+
+        if typeset == 0:
+            self.statusBar().showMessage('No translated groups to typeset. Translate the page or its groups first.')
+        elif overflowing:
+            self.statusBar().showMessage(f'Typeset {typeset} groups, {overflowing} did not fit their bubble.')
+        else:
+            self.statusBar().showMessage(f'Typeset {typeset} groups.')
+
+    def createEllipse(self, x, y, w, h):
+        bell = BoundingEllipse(x,y, w,h, self)
+        bell.setPen(self.noPen)
+        bell.text = '␟'
+        bell.origText = '␟'
+        bell.flagged = False
+        bell.updateFill()
+        bell.setFlag(QtWidgets.QGraphicsItem.ItemIsMovable)
+        bell.setFlag(QtWidgets.QGraphicsItem.ItemIsSelectable)
+        bell.setOpacity(self.retcomconfig.boundingBoxOpacity)
+        self.scene.addItem(bell)
+        self.bells.append(bell)
+        self.journal.markAdded(bell)
+
+        return bell
+
+    def ellipseOver(self, rect, exclude=()):
+        """Returns an ellipse covering the center of a rect, or `None`.
+
+        Used to reuse bubbles drawn by hand or loaded from a previous
+        session when typesetting a group.
+        """
+        center = rect.center()
+        x, y = center.x(), center.y()
+
+        for bell in self.sceneIndex.query((x, y, x, y), 'ell'):
+            if bell not in exclude:
+                return bell
+
+        return None
+
+    def typesetPage(self):
+        """Typesets the translation of every group into a bubble.
+
+        Each translated group gets an auto-fitted ellipse over its
+        bounding rect. Groups that were typeset before keep their
+        ellipse, only its text is refitted, and an existing ellipse over
+        the center of a group is reused. The whole page is processed
+        as one batch, with scene indexing and view updates suspended.
+
+        Returns:
+            A tuple `(typeset, overflowing)`, the number of typeset groups
+            and the number of those whose text did not fit.
+        """
+        groups = [group for group in self.groups if group.translation and not group.translation.isspace()]
+
+        self.flushGroupShapes()
+
+        typeset = 0
+        overflowing = 0
+
+        # Ellipses already holding the text of a group
+        claimed = set(group.bell for group in groups if group.bell is not None)
+
+        indexMethod = self.scene.itemIndexMethod()
+        self.view.setUpdatesEnabled(False)
+        self.scene.setItemIndexMethod(QtWidgets.QGraphicsScene.NoIndex)
+
+        try:
+            for group in groups:
+                bell = group.bell
+                if bell is None or bell.scene() is not self.scene:
+                    rect = group.rect()
+                    bell = self.ellipseOver(rect, claimed)
+                    if bell is None:
+                        bell = self.createEllipse(rect.x(), rect.y(), rect.width(), rect.height())
+                    group.bell = bell
+                    claimed.add(bell)
+
+                bell.autoFit = True
+                bell.fitSource = group.translation
+                if not bell.fitContents():
+                    bell.fitSource = None
+                    bell.displayText = group.translation
+                    overflowing += 1
+
+                bell.alignContents()
+                typeset += 1
+        finally:
+            self.scene.setItemIndexMethod(indexMethod)
+            self.view.setUpdatesEnabled(True)
+            self.view.viewport().update()
+
+        return typeset, overflowing
+
+    def sidecarBasePath(self):
+        head, tail = os.path.split(self.imagePath)
+
+        return os.path.normpath(os.path.join(head, self.retcomconfig.boxPath, tail))
+
+    def startAutosave(self):
+        """Starts journaling edits, offering to recover a crashed session.
+
+        Returns:
+            True if a previous session was recovered.
+        """
+        if not self.retcomconfig.autosave:
+            return False
+
+        basePath = self.sidecarBasePath()
+        box, ell = '', ''
+
+        if EditLog.exists(basePath):
+            ret = QtWidgets.QMessageBox.question(self, "RetCom | Recovery", "This page was not closed properly. Do you want to recover the unsaved session?", QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No, QtWidgets.QMessageBox.Yes)
+            if ret == QtWidgets.QMessageBox.Yes:
+                try:
+                    box, ell = EditLog.recover(basePath)
+                except (OSError, ValueError, KeyError):
+                    QtWidgets.QMessageBox.warning(self, "RetCom | Recovery", "The session journal could not be read.")
+
+        self.autosave = EditLog(basePath)
+        recovered = bool(box or ell)
+
+        if recovered:
+            with open(self.autosave.boxPath, 'w', encoding="utf8") as f:
+                f.write(box)
+            self.parseLSTMBox(self.autosave.boxPath)
+
+            if ell:
+                with open(self.autosave.ellPath, 'w', encoding="utf8") as f:
+                    f.write(ell)
+                self.parseTXTEll(self.autosave.ellPath)
+        else:
+            self.compactAutosave()
+
+        self.autosaveTimer.start(self.retcomconfig.autosaveInterval)
+
+        return recovered
+
+    def stopAutosave(self, discard=False):
+        if self.autosave:
+            self.autosaveTimer.stop()
+            if not discard:
+                self.flushAutosave()
+            self.autosave.close(discard)
+            self.autosave = None
+
+    def closePage(self):
+        """Releases the items of the page once the window is closed.
+
+        Drops every reference the window keeps to boxes, groups and
+        ellipses, so a closed page does not keep its scene alive.
+        """
+        self.groupShapeTimer.stop()
+        self.staleGroups.clear()
+
+        # Items emit selection changes while the scene is destroyed
+        self.scene.selectionChanged.disconnect(self.onSelectionChanged)
+
+        self.groups.clear()
+        self.bboxes.clear()
+        self.bells.clear()
+        self.sceneIndex.clear()
+        self.selection.clear()
+        self.boxLayer.boxes.clear()
+        self.journal.clear()
+        self.journal.takePending()
+
+        self.boxModel.reset()
+
+    @QtCore.Slot()
+    def flushAutosave(self):
+        if not self.autosave:
+            return
+
+        for item in self.journal.takePending():
+            if hasattr(item, 'isBbox'):
+                kind = 'box'
+            elif hasattr(item, 'isBell'):
+                kind = 'ell'
+            else:
+                continue
+
+            rows = self.describeItem(item) if item.scene() is not None else None
+            self.autosave.record(item, kind, rows)
+
+        if self.autosave.records >= self.retcomconfig.autosaveCompactThreshold:
+            self.compactAutosave()
+
+    def compactAutosave(self):
+        if not self.autosave:
+            return
+
+        # Everything pending is covered by the snapshot
+        self.journal.takePending()
+
+        boxItems = [(item, self.describeItem(item)) for item in self.iterLSTMBoxItems()]
+        ellItems = [(bell, self.describeItem(bell)) for bell in self.bells]
+        self.autosave.compact(boxItems, ellItems)
+
     def parseLSTMBox(self, path):
+        isSidecar = os.path.normpath(path) == self.sidecarBasePath() + '.py.box'
+
+        with self.journal.suspended():
+            bboxes = self.loadLSTMBox(path)
+
+        # Boxes loaded from anywhere but the sidecar count as additions
+        if not isSidecar:
+            for bbox in bboxes:
+                self.journal.markAdded(bbox)
+        else:
+            self.loadTranslations()
+
+        self.compactAutosave()
+
+    def loadLSTMBox(self, path):
+        """Loads the boxes of an LSTMBox file into the scene.
+
+        All boxes and groups are built before any of them is added, and
+        are then added in one pass with scene indexing and view updates
+        suspended, so the scene and the tree are only updated once.
+
+        Returns:
+            The loaded bounding boxes.
+        """
         self.lstmbox = LSTMBox(path, self.verticalText)
 
-        for val in self.lstmbox.boxList:
+        bboxes = self.buildLSTMBoxes(self.lstmbox.boxList)
+        groups = self.buildLSTMGroups(bboxes)
+
+        indexMethod = self.scene.itemIndexMethod()
+        self.view.setUpdatesEnabled(False)
+        self.scene.setItemIndexMethod(QtWidgets.QGraphicsScene.NoIndex)
+
+        try:
+            for bbg in groups:
+                self.scene.addItem(bbg)
+
+            for bbox, _ in bboxes:
+                self.scene.addItem(bbox)
+
+            self.bboxes.extend(bbox for bbox, _ in bboxes)
+
+            # Members are in the scene now, bounds can be computed at once
+            for bbg in groups:
+                self.staleGroups.discard(bbg)
+                bbg.refreshShape()
+        finally:
+            self.scene.setItemIndexMethod(indexMethod)
+            self.view.setUpdatesEnabled(True)
+            self.view.viewport().update()
+
+        self.bboxSettings.bbTree.syncTree()
+
+        return [bbox for bbox, _ in bboxes]
+
+    def buildLSTMBoxes(self, boxList):
+        """Creates bounding boxes for LSTMBox rows without adding them.
+
+        Returns:
+            A list of `(bbox, n)` pairs, `n` being the group number of the
+            row, or 0 if ungrouped.
+        """
+        config = self.retcomconfig
+        imageHeight = self.image.height()
+        flags = QtWidgets.QGraphicsItem.ItemIsMovable | QtWidgets.QGraphicsItem.ItemIsSelectable
+
+        bboxes = []
+        for val in boxList:
             txt = val[0]
 
             c = val[1]
             w = c[2]-c[0]
             h = c[3]-c[1]
-            x, y = c[0], self.image.height()-c[3]
+            x, y = c[0], imageHeight-c[3]
 
             n = c[4]
 
             if txt != '␟':
                 if self.fontGeom:
                     if self.verticalText:
-                        ar = self.fontGeom.getTextAspectRatio(txt)
+                        ar = self.fontGeom.getTextAspectRatio(txt, order='h/w', vertical=True)
                         bbox = BoundingBox(x,y, w,ar*w*self.lengthBias, self)
                     else:
                         ar = self.fontGeom.getTextAspectRatio(txt)
@@ -579,48 +1085,66 @@ class RetCom(QtWidgets.QMainWindow):
             bbox.actualW = w
             bbox.actualH = h
 
+            # Brushes and pens are shared by all boxes
             bbox.setPen(self.noPen)
-            if bbox.aspectRatio < self.retcomconfig.suspiciousAspectRatio:
+            if bbox.aspectRatio < config.suspiciousAspectRatio:
                 if txt != '␟':
-                    bbox.setBrush(self.retcomconfig.flaggedBoxBrush)
+                    bbox.setBrush(config.flaggedBoxBrush)
                     bbox.flagged = True
             else:
                 if txt != '␟':
-                    bbox.setBrush(self.retcomconfig.boundingBoxBrush)
+                    bbox.setBrush(config.boundingBoxBrush)
                 else:
-                    bbox.setBrush(self.retcomconfig.fillerBoxBrush)
+                    bbox.setBrush(config.fillerBoxBrush)
 
-            if self.retcomconfig.fullWidth:
+            if config.fullWidth:
                 txt = half2fullWidth(txt)
             else:
                 txt = full2halfWidth(txt)
 
-            bbox.setFlag(QtWidgets.QGraphicsItem.ItemIsMovable)
-            bbox.setFlag(QtWidgets.QGraphicsItem.ItemIsSelectable)
-            bbox.setOpacity(self.retcomconfig.boundingBoxOpacity)
+            bbox.setFlags(bbox.flags() | flags)
+            bbox.setOpacity(config.boundingBoxOpacity)
             bbox.text = txt
             bbox.origText = txt
 
-            self.bboxes.append(bbox)
+            bboxes.append((bbox, n))
+
+        return bboxes
+
+    def buildLSTMGroups(self, bboxes):
+        """Adds boxes to the groups their rows are numbered with.
+
+        Groups missing from the page are created under the numbers of
+        their rows, without adding them to the scene.
 
+        Args:
+            bboxes (list): `(bbox, n)` pairs as returned by
+                `buildLSTMBoxes`.
+
+        Returns:
+            The created groups.
+        """
+        members = defaultdict(list)
+        for bbox, n in bboxes:
             if n != 0:
-                if BoundingBoxGroup.groups[self.scene][n]:
-                    bbg = BoundingBoxGroup.groups[self.scene][n]
-                    bbg.add(bbox)
-                    bbg.updateShape()
-                else:
-                    while not BoundingBoxGroup.groups[self.scene][n]:
-                        bbg = BoundingBoxGroup([], self.scene, self)
-                        bbg.setBrush(self.retcomconfig.groupBoxBrush)
-                        bbg.setOpacity(self.retcomconfig.groupBoxOpacity)
-                        self.scene.addItem(bbg)
+                members[n].append(bbox)
 
-                    bbg.add(bbox)
-                    bbg.updateShape
+        created = []
+        for n in sorted(members):
+            bbg = self.groups.get(n)
+            if bbg is None:
+                bbg = BoundingBoxGroup([], self.scene, self, number=n)
+                bbg.setBrush(self.retcomconfig.groupBoxBrush)
+                bbg.setOpacity(self.retcomconfig.groupBoxOpacity)
+                created.append(bbg)
 
-            # self.rects.append(bbox)
-            self.scene.addItem(bbox)
-            self.bboxSettings.bbTree.fillTree()
+            for bbox in members[n]:
+                bbg.add(bbox)
+
+            if bbg not in created:
+                bbg.updateShape()
+
+        return created
 
         # for c in lstmbox.boxCleaned:
         #     w = c[3]-c[1]
@@ -657,69 +1181,108 @@ class RetCom(QtWidgets.QMainWindow):
             bell.setOpacity(self.retcomconfig.boundingBoxOpacity)
             bell.displayText = txt
             bell.fontSize = size
-            bell.font.setFamily(family)
-            bell.displayTextItem.setFont(bell.font)
+            bell.fontFamily = family
             bell.color = QtGui.QColor(color)
             bell.displayTextItem.setDefaultTextColor(bell.color)
             bell.alignContents()
             self.bells.append(bell)
             self.scene.addItem(bell)
+            self.journal.markAdded(bell)
 
+        self.compactAutosave()
 
-    def createLSTMBox(self):
-        lines = []
-        h = self.image.height()
-        accountedFor = []
 
-        groups = BoundingBoxGroup.groups[self.scene]
+    def describeItem(self, item):
+        """Serializes a single item for the change journal.
 
-        for n in sorted(list(groups.keys())):
-            group = groups[n]
+        Boxes are described by their LSTMBox rows, ellipses by their
+        TXTEll entry, and groups by their number and members.
+        """
+        if hasattr(item, 'isBbox'):
+            return self.lstmboxRows(item)
+        elif hasattr(item, 'isBell'):
+            return ['::||::'.join([item.displayText, str(item.fontSize), str(item.fontFamily), str(item.color.rgb()), str(round(item.sceneX)), str(round(item.sceneY)), str(round(item.currentW)), str(round(item.currentH))])]
+        elif hasattr(item, 'isBboxGroup'):
+            return [f'[[G{item.number}]] ' + ' '.join(str(bbox.text) for bbox in item.items)]
+        else:
+            return []
 
-            for item in group.items:
-                line = [0,0,0,0,0]
-                rect = item.sceneBoundingRect()
-                topLeft = rect.topLeft()
-                line[0] = topLeft.x()
-                line[3] = h - topLeft.y()
-                line[1] = line[3] - rect.height()
-                line[2] = line[0] + rect.width()
+    def lstmboxRows(self, item, imageHeight=None):
+        """Returns the LSTMBox rows of a box, one per character.
+
+        Args:
+            item (BoundingBox): Box to serialize.
+            imageHeight (int): Image height, LSTMBox coordinates are
+                measured from the bottom. Looked up when not given.
+        """
+        if not item.text:
+            return []
 
-                line[4] = n
+        if imageHeight is None:
+            imageHeight = self.image.height()
 
-                line = [str(round(el)) for el in line]
+        rect = item.sceneBoundingRect()
+        topLeft = rect.topLeft()
+        if item.group:
+            w, h = rect.width(), rect.height()
+        else:
+            w, h = item.rect().width(), item.rect().height()
+
+        x = topLeft.x()
+        top = imageHeight - topLeft.y()
+
+        # Coordinates are shared by every character of the box
+        coords = f' {round(x)} {round(top - h)} {round(x + w)} {round(top)} {item.group.number if item.group else 0}'
+
+        return [char + coords for char in item.text]
 
-                lines.append('\n'.join(' '.join([char] + line) for char in item.text))
-                accountedFor.append(item)
+    def iterLSTMBoxItems(self):
+        """Yields all boxes in LSTMBox export order.
 
+        Grouped boxes come first, ordered by group number, followed by
+        all ungrouped boxes in page order.
+        """
+        accountedFor = set()
+
+        for group in self.groups:
+            for item in group.items:
+                accountedFor.add(id(item))
+                yield item
 
         for item in self.bboxes:
-            if item not in accountedFor:
-                line = [0,0,0,0,0]
-                topLeft = item.sceneBoundingRect().topLeft()
-                line[0] = topLeft.x()
-                line[3] = h - topLeft.y()
-                line[1] = line[3] - item.rect().height()
-                line[2] = line[0] + item.rect().width()
+            if id(item) not in accountedFor:
+                yield item
 
-                line = [str(round(el)) for el in line]
+    def writeLSTMBox(self, stream):
+        """Writes the LSTMBox of the current page to a text stream."""
+        imageHeight = self.image.height()
+        separator = ''
 
-                lines.append('\n'.join(' '.join([char] + line) for char in item.text))
+        for item in self.iterLSTMBoxItems():
+            rows = self.lstmboxRows(item, imageHeight)
+            if rows:
+                stream.write(separator)
+                stream.write('\n'.join(rows))
+                separator = '\n'
 
-                accountedFor.append(item)
+    def createLSTMBox(self):
+        buffer = io.StringIO()
+        self.writeLSTMBox(buffer)
 
-        return '\n'.join(lines)
+        return buffer.getvalue()
 
     def exportLSTMBox(self, path):
-        lstmbox = self.createLSTMBox()
+        with open(path, 'w+', encoding="utf8") as f:
+            self.writeLSTMBox(f)
 
-        with open(path, 'w+') as f:
-            f.write(lstmbox)
+        # Only the page's own box file counts as saved
+        if os.path.normpath(path) == self.sidecarBasePath() + '.py.box':
+            self.journal.clear((BoundingBox, BoundingBoxGroup))
 
     def exportTXTEll(self, path):
         txtell_l = []
         for bell in self.bells:
-            info = '::||::'.join([bell.displayText, str(bell.fontSize), str(bell.font.family()), str(bell.color.rgb()), str(round(bell.sceneX)), str(round(bell.sceneY)), str(round(bell.currentW)), str(round(bell.currentH))])
+            info = '::||::'.join([bell.displayText, str(bell.fontSize), str(bell.fontFamily), str(bell.color.rgb()), str(round(bell.sceneX)), str(round(bell.sceneY)), str(round(bell.currentW)), str(round(bell.currentH))])
             txtell_l.append(info)
         
         txtell = '::|--|::'.join(txtell_l)
@@ -727,10 +1290,27 @@ class RetCom(QtWidgets.QMainWindow):
         with open(path, 'w+') as f:
             f.write(txtell)
 
+        if os.path.normpath(path) == self.sidecarBasePath() + '.py.ell':
+            self.journal.clear(BoundingEllipse)
+
     def resizeEvent(self, event):
         self.view.setGeometry(0,0, self.width(), self.height())
         self.bboxSettings.adjustSize()
 
+    def invalidateGroupShape(self, group):
+        self.staleGroups.add(group)
+        if not self.groupShapeTimer.isActive():
+            self.groupShapeTimer.start()
+
+    @QtCore.Slot()
+    def flushGroupShapes(self):
+        """Recomputes the bounds of all groups marked stale."""
+        groups, self.staleGroups = self.staleGroups, set()
+        self.groupShapeTimer.stop()
+
+        for group in groups:
+            group.refreshShape()
+
     def resizeSelectedUniformly(self, s=1):
         selectedItems = self.scene.selectedItems()
         for item in selectedItems:
@@ -739,7 +1319,12 @@ class RetCom(QtWidgets.QMainWindow):
 
     @QtCore.Slot()
     def onSelectionChanged(self):
-        for item in self.scene.items():
+        # Only items whose selection state changed need a new fill
+        selection = set(self.scene.selectedItems())
+        changed = selection ^ self.selection
+        self.selection = selection
+
+        for item in changed:
             if hasattr(item, 'isBbox') or hasattr(item, 'isBell'):
                 item.updateFill()
                 # if item in selectedItems:
@@ -751,12 +1336,10 @@ class RetCom(QtWidgets.QMainWindow):
                 #     # print(f"{item.text} unselected")
                 #     item.setBrush(self.redBrush)
 
-        if len(self.scene.selectedItems()) == 1:
-            for item in self.scene.selectedItems():
+        if len(selection) == 1:
+            for item in selection:
                 if hasattr(item, 'isBbox'):
-                    if item.treeItem:
-                        self.bboxSettings.bbTree.scrollToItem(item.treeItem)
-                        self.bboxSettings.bbTree.setCurrentItem(item.treeItem)
+                    self.bboxSettings.bbTree.reveal(item)
                     # self.simpleText.setHtml(f"<span style='background-color:white;color:black;'>{item.text}</span>")
                     # self.bboxSettings.bbText.setText(item.text)
 
@@ -764,6 +1347,7 @@ class RetCom(QtWidgets.QMainWindow):
         selectedItems = self.scene.selectedItems()
         for item in selectedItems:
             if hasattr(item, 'isBbox'):
+                self.journal.markRemoved(item)
                 self.scene.removeItem(item)
                 self.bboxes.remove(item)
                 if item.group:
@@ -771,25 +1355,28 @@ class RetCom(QtWidgets.QMainWindow):
                     item.group.remove(item)
                     group.updateShape()
             elif hasattr(item, 'isBell'):
+                self.journal.markRemoved(item)
                 item.disband()
                 self.scene.removeItem(item)
                 self.bells.remove(item)
 
     def removeFlagged(self):
-        for item in self.scene.items():
-            if hasattr(item, 'isBbox'):
-                if item.flagged:
-                    self.scene.removeItem(item)
-                    self.bboxes.remove(item)
-                    if item.group:
-                        group = item.group
-                        item.group.remove(item)
-                        group.updateShape()
-            elif hasattr(item, 'isBell'):
-                if item.flagged:
-                    item.disband()
-                    self.scene.removeItem(item)
-                    self.bells.remove(item)
+        for item in self.sceneIndex.items('box'):
+            if item.flagged:
+                self.journal.markRemoved(item)
+                self.scene.removeItem(item)
+                self.bboxes.remove(item)
+                if item.group:
+                    group = item.group
+                    item.group.remove(item)
+                    group.updateShape()
+
+        for item in self.sceneIndex.items('ell'):
+            if item.flagged:
+                self.journal.markRemoved(item)
+                item.disband()
+                self.scene.removeItem(item)
+                self.bells.remove(item)
 
     def restoreSelected(self):
         selectedItems = self.scene.selectedItems()
@@ -809,6 +1396,7 @@ class RetCom(QtWidgets.QMainWindow):
                 item.flagged = flag
                 # print(item.text, item.flagged)
                 item.updateFill()
+                self.boxModel.itemChanged(item)
 
     def makeGroupFromSelected(self):
         bbg = BoundingBoxGroup(sorted(self.scene.selectedItems(), key=lambda x: self.bboxes.index(x)), self.scene, self)
@@ -816,6 +1404,7 @@ class RetCom(QtWidgets.QMainWindow):
         bbg.setOpacity(self.retcomconfig.groupBoxOpacity)
         # bbg.setZValue(0)
         self.scene.addItem(bbg)
+        self.journal.markAdded(bbg)
         # print(bbg.groups)
 
     def removeSelectedFromGroup(self):
@@ -824,6 +1413,8 @@ class RetCom(QtWidgets.QMainWindow):
             if hasattr(item, 'isBbox'):
                 if item.group:
                     group = item.group
+                    item.markDirty()
+                    group.markDirty()
                     item.group = None
                     group.items.remove(item)
                     group.updateShape()
@@ -972,6 +1563,7 @@ class RetCom(QtWidgets.QMainWindow):
             self.scene.addItem(bbox)
             bbox.setSelected(True)
             self.bboxes.append(bbox)
+            self.journal.markAdded(bbox)
         else:
             selectedItems = self.scene.selectedItems()
             for item in selectedItems:
@@ -988,7 +1580,7 @@ class RetCom(QtWidgets.QMainWindow):
             if len(selectedItems) == 1:
                 selectedItems[0].setSelected(True)
 
-        self.bboxSettings.bbTree.fillTree()
+        self.bboxSettings.bbTree.syncTree()
 
 
     def displaceSelected(self, direction, amount):
@@ -1006,17 +1598,15 @@ class RetCom(QtWidgets.QMainWindow):
                     item.group.hide()
 
     def hideAll(self):
-        for item in self.scene.items():
-            if hasattr(item, 'isBell') or hasattr(item, 'isBbox') or hasattr(item, 'isBboxGroup'):
-                item.hide()
+        for item in self.sceneIndex.items('box', 'ell', 'group'):
+            item.hide()
 
-        for _, group in BoundingBoxGroup.groups[self.scene].items():
+        for group in self.groups:
             group.hide()
 
     def unhideAll(self):
-        for item in self.scene.items():
-            if hasattr(item, 'isBell') or hasattr(item, 'isBbox') or hasattr(item, 'isBboxGroup'):
-                item.show()
+        for item in self.sceneIndex.items('box', 'ell', 'group'):
+            item.show()
 
         # for bell in self.bells:
         #     bell.show()
@@ -1024,7 +1614,7 @@ class RetCom(QtWidgets.QMainWindow):
         # for bbox in self.bboxes:
         #     bbox.show()
 
-        # for _, group in BoundingBoxGroup.groups[self.scene].items():
+        # for group in self.groups:
         #     group.show()
 
     def keyPressEvent(self, event):
@@ -1037,11 +1627,11 @@ class RetCom(QtWidgets.QMainWindow):
             else:
                 self.removeSelected()
 
-            self.bboxSettings.bbTree.fillTree()
+            self.bboxSettings.bbTree.syncTree()
         # RESTORE SELECTED
         elif event.key() == QtCore.Qt.Key_R:
             self.restoreSelected()
-            self.bboxSettings.bbTree.fillTree()
+            self.bboxSettings.bbTree.syncTree()
         # FLAG / UNFLAG
         elif event.key() == QtCore.Qt.Key_F:
             if modifiers == QtCore.Qt.ShiftModifier:
@@ -1095,27 +1685,18 @@ class RetCom(QtWidgets.QMainWindow):
                     self.scene.addItem(bbox)
                     bbox.setSelected(True)
                     self.bboxes.append(bbox)
+                    self.journal.markAdded(bbox)
 
-                self.bboxSettings.bbTree.fillTree()
+                self.bboxSettings.bbTree.syncTree()
         # ADD ELLIPSE
         elif event.key() == QtCore.Qt.Key_T:
             rect = self.view.mapToScene(self.view.rubberBandRect()).boundingRect()
             if (rect.width() > 0) and (rect.height() > 0):
                 # anchor = self.view.mapToScene(QtCore.QPoint(rect.x(), rect.y()))
                 topLeft = rect.topLeft()
-                bell = BoundingEllipse(topLeft.x(),topLeft.y(), rect.width(),rect.height(), self)
-                bell.setPen(self.noPen)
-                bell.text = '␟'
-                bell.origText = '␟'
-                bell.flagged = False
-                bell.updateFill()
-                bell.setFlag(QtWidgets.QGraphicsItem.ItemIsMovable)
-                bell.setFlag(QtWidgets.QGraphicsItem.ItemIsSelectable)
-                bell.setOpacity(self.retcomconfig.boundingBoxOpacity)
-                self.scene.addItem(bell)
+                bell = self.createEllipse(topLeft.x(),topLeft.y(), rect.width(),rect.height())
                 bell.setSelected(True)
                 bell.changeTextEvent()
-                self.bells.append(bell)
         # HIDE ELLIPSE
         elif event.key() == QtCore.Qt.Key_H:
             if modifiers == QtCore.Qt.ShiftModifier:
@@ -1129,7 +1710,7 @@ class RetCom(QtWidgets.QMainWindow):
             else:
                 self.makeGroupFromSelected()
 
-            self.bboxSettings.bbTree.fillTree()
+            self.bboxSettings.bbTree.syncTree()
         # SCAN SELECTION AND MAKE BBOX
         elif event.key() == QtCore.Qt.Key_S:
             if modifiers == QtCore.Qt.ShiftModifier:
@@ -1198,29 +1779,25 @@ class RetCom(QtWidgets.QMainWindow):
                 self.view.scale(1 - self.retcomconfig.scaleMultiplier, 1 - self.retcomconfig.scaleMultiplier)
 
     def checkLSTMBoxChange(self):
-        head, tail = os.path.split(self.imagePath)
-        boxPathDir = os.path.join(head, self.retcomconfig.boxPath)
-        boxPath = os.path.normpath(os.path.join(boxPathDir, tail))
+        if not os.path.exists(self.sidecarBasePath() + '.py.box'):
+            return 'New file.', True
 
-        try:
-            with open(boxPath + '.py.box', 'r', encoding="utf8") as f:
-                current = f.read()
+        # Saving on close only writes the box file, so ellipse edits are
+        # not reported here
+        kind = (BoundingBox, BoundingBoxGroup)
+        if not self.journal.isDirty(kind):
+            return '', False
 
-            new = self.createLSTMBox()
+        diff = self.journal.diff(kind)
 
-            if len(new.encode('utf-8')) <= self.retcomconfig.changeCheckThreshold:
-                if new != current:
-                    return ''.join(difflib.ndiff(current.splitlines(1), new.splitlines(1))), True
-                else:
-                    return '', False
-            else:
-                return 'File size exceeds checking threshold; contents might not have changed.', True
-        except OSError:
-            return 'New file.', True
+        return diff, diff != ''
 
     def closeEvent(self, event):
         event.ignore()
 
+        if self.translator.memory is not None:
+            self.translator.memory.save()
+
         diff, hasChanged = self.checkLSTMBoxChange()
 
         if hasChanged:
@@ -1230,19 +1807,27 @@ class RetCom(QtWidgets.QMainWindow):
             msgBox.setDetailedText(diff)
             msgBox.setStandardButtons(QtWidgets.QMessageBox.Save | QtWidgets.QMessageBox.Discard | QtWidgets.QMessageBox.Cancel)
             msgBox.setDefaultButton(QtWidgets.QMessageBox.Save)
+            self.retcomconfig.fontRegistry.registerQtFont('Noto Sans Mono')
             msgBox.setStyleSheet( "QMessageBox QTextEdit { font-family: 'Noto Sans Mono', 'Courier', 'Courier New'; }")
             ret = msgBox.exec_()
 
             if ret == QtWidgets.QMessageBox.Save:
-                self.exportLSTMBoxEvent()
+                # Keep the window and its journal if the save was cancelled
+                if not self.exportLSTMBoxEvent():
+                    return
+
                 if self.retcomconfig.removeScanImage and ('rctemp_' in self.imagePath):
                     os.remove(self.imagePath)
 
+                self.stopAutosave(discard=True)
+                self.closePage()
                 event.accept()
             elif ret == QtWidgets.QMessageBox.Discard:
                 if self.retcomconfig.removeScanImage and ('rctemp_' in self.imagePath):
                     os.remove(self.imagePath)
 
+                self.stopAutosave(discard=True)
+                self.closePage()
                 event.accept()
             elif ret == QtWidgets.QMessageBox.Cancel:
                 pass
@@ -1251,6 +1836,8 @@ class RetCom(QtWidgets.QMainWindow):
                 if self.retcomconfig.removeScanImage and ('rctemp_' in self.imagePath):
                     os.remove(self.imagePath)
 
+                self.stopAutosave(discard=True)
+                self.closePage()
                 event.accept()
 
     # def mousePressEvent(self, event):
@@ -1259,27 +1846,169 @@ class RetCom(QtWidgets.QMainWindow):
     #     if self.rect.contains(self.rect.mapFromScene(pos)):
     #         print('In', event.pos())
 
+# Stable ids of boxes and groups, unique across pages
+ITEM_IDS = itertools.count(1)
+
+def indexRect(item):
+    """Scene bounding rect of an item, as a `SceneIndex` rect."""
+    rect = item.sceneBoundingRect()
+
+    return (rect.left(), rect.top(), rect.right(), rect.bottom())
+
+class GeometryField(object):
+    """Float attribute stored in the `geometry` array of an item.
+
+    Boxes and ellipses keep their original and OCR sizes in one compact
+    array of doubles instead of one dict entry and float object each.
+
+    Args:
+        i (int): Position of the value in the array.
+    """
+
+    def __init__(self, i):
+        self.i = i
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+
+        return obj.geometry[self.i]
+
+    def __set__(self, obj, value):
+        obj.geometry[self.i] = value
+
+class BoxLayer(QtWidgets.QGraphicsItem):
+    """Paints the unselected bounding boxes of a scene in one item.
+
+    Layered boxes stay in the scene, so they are hit, selected and
+    indexed like any other item, but are flagged `ItemHasNoContents` and
+    painted here instead, with one `drawRects` call per pen and brush.
+    Painting a view then costs one `paint` call, however many boxes it
+    shows. Boxes are promoted back to painting themselves while they are
+    selected, so selection outlines and dragging look as before. Hidden
+    boxes are dropped from the layer.
+
+    Only used if `RetComConfig.boxLayer` is set. The layer is added to
+    the scene with its first box, so it costs nothing otherwise.
+
+    Args:
+        parent (RetCom): Window whose boxes are painted.
+    """
+
+    def __init__(self, parent):
+        super(BoxLayer, self).__init__()
+
+        self.parent = parent
+
+        # Layered boxes, with their scene rect and fill
+        self.boxes = {}
+        self.styles = {}
+
+        # Boxes seldom leave the page, so the bounds seldom need to grow
+        self.bounds = parent.imagePixmapItem.sceneBoundingRect()
+
+        self.setZValue(-1)
+        self.setAcceptedMouseButtons(QtCore.Qt.NoButton)
+        self.setFlag(QtWidgets.QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    @property
+    def enabled(self):
+        return self.parent.retcomconfig.boxLayer
+
+    def boundingRect(self):
+        return self.bounds
+
+    def paint(self, painter, option, widget=None):
+        if not self.boxes:
+            return
+
+        exposed = option.exposedRect
+        rect = (exposed.left(), exposed.top(), exposed.right(), exposed.bottom())
+
+        batches = defaultdict(list)
+        for box in self.parent.sceneIndex.query(rect, 'box'):
+            entry = self.boxes.get(box)
+            if entry is not None:
+                batches[entry[1]].append(entry[0])
+
+        # Fills sort by z value first, so stacking matches the items
+        for fill in sorted(batches):
+            pen, brush = self.styles[fill]
+            painter.setOpacity(fill[1])
+            painter.setPen(pen)
+            painter.setBrush(brush)
+            painter.drawRects(batches[fill])
+
+    def track(self, box):
+        """Layers, repaints or promotes `box` after it changed."""
+        if box.scene() is not None and box.isVisible() and not box.isSelected() and self.enabled:
+            self.layer(box)
+        else:
+            self.promote(box)
+
+    def layer(self, box):
+        rect = box.sceneBoundingRect()
+        pen, brush = box.pen(), box.brush()
+        fill = (box.zValue(), box.opacity(), brush.color().rgba(), int(brush.style()), pen.color().rgba(), int(pen.style()), pen.widthF())
+        if fill not in self.styles:
+            self.styles[fill] = (pen, brush)
+
+        if self.scene() is None:
+            self.parent.scene.addItem(self)
+
+        old = self.boxes.get(box)
+        self.boxes[box] = (rect, fill)
+
+        if old is None:
+            box.setFlag(QtWidgets.QGraphicsItem.ItemHasNoContents, True)
+        elif old == (rect, fill):
+            return
+        else:
+            self.update(old[0])
+
+        if not self.bounds.contains(rect):
+            self.prepareGeometryChange()
+            self.bounds = self.bounds.united(rect)
+
+        self.update(rect)
+
+    def promote(self, box):
+        old = self.boxes.pop(box, None)
+        if old is None:
+            return
+
+        box.setFlag(QtWidgets.QGraphicsItem.ItemHasNoContents, False)
+        box.update()
+        self.update(old[0])
+
 class BoundingBox(QtWidgets.QGraphicsRectItem):
+    # Changes that affect how the box layer paints a box
+    layerChanges = (
+        QtWidgets.QGraphicsItem.ItemSelectedHasChanged,
+        QtWidgets.QGraphicsItem.ItemVisibleHasChanged,
+        QtWidgets.QGraphicsItem.ItemZValueHasChanged,
+        QtWidgets.QGraphicsItem.ItemOpacityHasChanged,
+    )
+
+    # Shared by all boxes until set on one
+    isBbox = True
+    flagged = False
+    group = None
+
+    origX = GeometryField(0)
+    origY = GeometryField(1)
+    origW = GeometryField(2)
+    origH = GeometryField(3)
+    actualW = GeometryField(4)
+    actualH = GeometryField(5)
+
     def __init__(self, x=0, y=0, w=100, h=100, parent=None):
         super(BoundingBox, self).__init__(0,0, w,h)
         self.setPos(x, y)
 
-        self.group = None
-        self.treeItem = None 
-
-        self.actualW = w
-        self.actualH = h
-
-        self.currentW = w
-        self.currentH = h
-
-        self.origX = x
-        self.origY = y
-        self.origW = w
-        self.origH = h
+        self.uid = next(ITEM_IDS)
 
-        self.isBbox = True
-        self.flagged = False
+        self.geometry = array('d', (x, y, w, h, w, h))
 
         self.parent = parent
 
@@ -1298,6 +2027,7 @@ class BoundingBox(QtWidgets.QGraphicsRectItem):
 
     @text.setter
     def text(self, txt):
+        self.markDirty()
         self._text = txt
 
         if txt == '␟':
@@ -1305,6 +2035,22 @@ class BoundingBox(QtWidgets.QGraphicsRectItem):
         else:
             self.setZValue(-1)
 
+        if self.scene() is not None:
+            self.parent.boxModel.itemChanged(self)
+
+    def markDirty(self):
+        # Items that are still being set up are not tracked yet
+        if self.scene() is not None:
+            self.parent.journal.markDirty(self)
+
+    @property
+    def currentW(self):
+        return self.rect().width()
+
+    @property
+    def currentH(self):
+        return self.rect().height()
+
     @property
     def aspectRatio(self):
         # h = self.origH
@@ -1319,19 +2065,21 @@ class BoundingBox(QtWidgets.QGraphicsRectItem):
             return self.origW/self.origH
 
     def removeSelected(self):
+        self.parent.journal.markRemoved(self)
         self.parent.scene.removeItem(self)
 
         selectedItems = self.parent.scene.selectedItems()
         if len(selectedItems) > 1:
-            for item in self.parent.scene.items():
-                if hasattr(item, 'isBbox'):
-                    if item in selectedItems:
-                        self.parent.scene.removeItem(item)
-                        self.parent.bboxes.remove(item)
-                        if item.group:
-                            group = item.group
-                            item.group.remove(item)
-                            group.updateShape()
+            boxes = self.parent.sceneIndex.items('box')
+            for item in selectedItems:
+                if item in boxes:
+                    self.parent.journal.markRemoved(item)
+                    self.parent.scene.removeItem(item)
+                    self.parent.bboxes.remove(item)
+                    if item.group:
+                        group = item.group
+                        item.group.remove(item)
+                        group.updateShape()
 
     def restoreSelected(self):
         self.setPos(self.origX, self.origY)
@@ -1340,12 +2088,12 @@ class BoundingBox(QtWidgets.QGraphicsRectItem):
 
         selectedItems = self.parent.scene.selectedItems()
         if len(selectedItems) > 1:
-            for item in self.parent.scene.items():
-                if hasattr(item, 'isBbox'):
-                    if item in selectedItems:
-                        item.setPos(item.origX, item.origY)
-                        item.updateContent(item.origText)
-                        item.updateFill()
+            boxes = self.parent.sceneIndex.items('box')
+            for item in selectedItems:
+                if item in boxes:
+                    item.setPos(item.origX, item.origY)
+                    item.updateContent(item.origText)
+                    item.updateFill()
 
 
     def mousePressEvent(self, event):
@@ -1354,9 +2102,7 @@ class BoundingBox(QtWidgets.QGraphicsRectItem):
         if event.button() == QtCore.Qt.LeftButton:
             # self.parent.simpleText.setHtml(f"<span style='background-color:white;color:black;'>{self.text}</span>")
             # self.parent.bboxSettings.bbText.setText(self.text)
-            if self.treeItem:
-                self.parent.bboxSettings.bbTree.scrollToItem(self.treeItem)
-                self.parent.bboxSettings.bbTree.setCurrentItem(self.treeItem)
+            self.parent.bboxSettings.bbTree.reveal(self)
             # self.parent.simpleText.setText(self.text)
             # print(f"{self.text}; {event.pos().x(), event.pos().y()}")
         # elif event.button() == QtCore.Qt.RightButton:
@@ -1378,7 +2124,10 @@ class BoundingBox(QtWidgets.QGraphicsRectItem):
             rc = self.parent
 
             if rc.fontGeom:
-                ar = rc.fontGeom.getTextAspectRatio(txt)*rc.lengthBias
+                if rc.verticalText:
+                    ar = rc.fontGeom.getTextAspectRatio(txt, order='h/w', vertical=True)*rc.lengthBias
+                else:
+                    ar = rc.fontGeom.getTextAspectRatio(txt)*rc.lengthBias
             else:
                 ar = rc.charAspectRatio*len(txt)*rc.lengthBias
 
@@ -1404,42 +2153,59 @@ class BoundingBox(QtWidgets.QGraphicsRectItem):
             else:
                 self.setBrush(self.parent.retcomconfig.boundingBoxBrush)
 
+        self.parent.boxLayer.track(self)
 
     def resize(self, w, h):
-        self.currentW = w
-        self.currentH = h
+        self.markDirty()
 
         self.prepareGeometryChange()
         self.setRect(self.rect().adjusted(0,0, w-self.rect().width(),h-self.rect().height()))
+        self.parent.sceneIndex.move(self, indexRect(self))
+        self.parent.boxLayer.track(self)
         self.update()
 
     def itemChange(self, change, value):
         if change == QtWidgets.QGraphicsItem.ItemPositionChange:
+            self.markDirty()
             # print('item pos change')
             if self.group:
                 # print('updating shape...')
                 self.group.updateShape()
+        elif change == QtWidgets.QGraphicsItem.ItemPositionHasChanged:
+            self.parent.sceneIndex.move(self, indexRect(self))
+            self.parent.boxLayer.track(self)
+        elif change == QtWidgets.QGraphicsItem.ItemSceneHasChanged:
+            if self.scene() is not None:
+                self.parent.sceneIndex.add(self, 'box', indexRect(self))
+            else:
+                self.parent.sceneIndex.remove(self)
+                self.parent.selection.discard(self)
+            self.parent.boxLayer.track(self)
+        elif change in self.layerChanges:
+            self.parent.boxLayer.track(self)
 
         return value
 
 class BoundingBoxGroup(QtWidgets.QGraphicsRectItem):
-    groupNo = defaultdict(lambda: 1)
-    groups = defaultdict(lambda: defaultdict(lambda: None))
-
-    def __init__(self, items:[QtWidgets.QGraphicsItem], scene:QtWidgets.QGraphicsScene, parent=None):
+    def __init__(self, items:[QtWidgets.QGraphicsItem], scene:QtWidgets.QGraphicsScene, parent=None, number=None):
         super(BoundingBoxGroup, self).__init__(0,0, 1,1)
 
+        self.uid = next(ITEM_IDS)
         self.isBboxGroup = True
 
         self.items = items
         for item in items:
             if hasattr(item, 'isBbox'):
+                item.markDirty()
                 item.group = self
 
         # self.group = scene.createItemGroup(items)
         self.scene = scene
         self.parent = parent
-        self.treeItem = None
+
+        # Set by translating, and typeset into `bell`
+        self.translation = None
+        self.bell = None
 
         self.updateShape()
 
@@ -1447,10 +2213,7 @@ class BoundingBoxGroup(QtWidgets.QGraphicsRectItem):
         self.setBrush(QtGui.QColor(255, 255, 255, 0))
         self.setZValue(1)
 
-        self.number = self.groupNo[self.scene]
-        self.groupNo[self.scene] += 1
-
-        self.groups[self.scene][self.number] = self
+        self.number = self.parent.groups.register(self, number)
 
     def contextMenuEvent(self, event):
         menu = QtWidgets.QMenu()
@@ -1472,14 +2235,17 @@ class BoundingBoxGroup(QtWidgets.QGraphicsRectItem):
         menu.addAction(translateTextAction)
         menu.exec_(event.screenPos())
 
-    def collateTextEvent(self):
+    def collate(self):
         lines = []
         for bbox in self.items:
             text = bbox.text
             if text != '␟':
                 lines.append(text)
 
-        line = self.parent.retcomconfig.collationString.join(lines)
+        return self.parent.retcomconfig.collationString.join(lines)
+
+    def collateTextEvent(self):
+        line = self.collate()
 
         msgBox = QtWidgets.QMessageBox()
         msgBox.setText(line)
@@ -1487,16 +2253,16 @@ class BoundingBoxGroup(QtWidgets.QGraphicsRectItem):
         msgBox.exec_()
 
     def translateTextEvent(self):
-        lines = []
-        for bbox in self.items:
-            text = bbox.text
-            if text != '␟':
-                lines.append(text)
+        line = self.collate()
 
-        line = self.parent.retcomconfig.collationString.join(lines)
+        try:
+            self.translation = self.parent.translator.translateBatch([line], target=self.parent.retcomconfig.translationLanguage)[0]
+        except TranslationError as e:
+            QtWidgets.QMessageBox.warning(self.parent, f'G{self.number} translation', str(e))
+            return
 
         msgBox = QtWidgets.QMessageBox()
-        msgBox.setText(self.parent.translator.translate(line, detailed=True, target=self.parent.retcomconfig.translationLanguage)['resp'])
+        msgBox.setText(self.translation)
         msgBox.setDetailedText(line)
         msgBox.setWindowTitle(f'G{self.number} translated text')
         msgBox.exec_()
@@ -1510,47 +2276,346 @@ class BoundingBoxGroup(QtWidgets.QGraphicsRectItem):
         #     self.parent.bboxSettings.bbTree.scrollToItem(self.treeItem)
         #     self.parent.bboxSettings.bbTree.setCurrentItem(self.treeItem)
 
-    def boundingRect(self):
+    def memberRect(self):
         rect = QtCore.QRectF()
         for item in self.items:
             rect = rect.united(item.sceneBoundingRect())
 
-        # print(rect)
-
         return rect
 
-
     def updateShape(self):
-        bRect = self.boundingRect()
-        cRect = self.rect()
-        self.prepareGeometryChange()
-        # self.setRect(cRect.adjusted(bRect.x() - cRect.x(),bRect.y() - cRect.y(), bRect.width() - cRect.width(),bRect.height() - cRect.height()))
-        self.setRect(bRect)
-        self.update()
-        self.scene.update()
+        """Marks the group bounds stale.
+
+        Bounds are recomputed once per event loop tick by
+        `RetCom.flushGroupShapes`, however often members move until then.
+        """
+        self.parent.invalidateGroupShape(self)
+
+    def refreshShape(self):
+        """Recomputes the group bounds right away."""
+        rect = self.memberRect()
+
+        # setRect only repaints the old and new bounds
+        if rect != self.rect():
+            self.setRect(rect)
         
+    def markDirty(self):
+        self.parent.journal.markDirty(self)
+
     def add(self, item):
+        self.markDirty()
+        item.markDirty()
         self.items.append(item)
         item.group = self
 
     def remove(self, item):
+        self.markDirty()
+        item.markDirty()
         self.items.remove(item)
         item.group = None
 
     def disband(self):
-        self.groups[self.scene][self.number] = None
+        self.parent.journal.markRemoved(self)
+        self.parent.groups.unregister(self)
         self.scene.removeItem(self)
 
-class BoundingBoxTree(QtWidgets.QTreeWidget):
+    def itemChange(self, change, value):
+        if change == QtWidgets.QGraphicsItem.ItemSceneHasChanged:
+            if value is not None:
+                self.parent.sceneIndex.add(self, 'group')
+            else:
+                self.parent.sceneIndex.remove(self)
+                self.parent.selection.discard(self)
+
+        return value
+
+class BoundingBoxModel(QtCore.QAbstractItemModel):
+    """Item model of the groups and boxes of a page.
+
+    Groups come first, ordered by number, each with its boxes as
+    children, followed by all ungrouped boxes in page order. The model
+    keeps a snapshot of that structure, and `sync` brings it up to date
+    with the page by emitting only the row insertions and removals that
+    changed, so views keep their state and only touch the affected rows.
+    Text and flag changes of single boxes are signalled by `itemChanged`.
+
+    Indexes carry the stable `uid` of their group or box, which maps back
+    to the item through `objects`. Rows of items are looked up in per
+    parent maps, rebuilt only for the parents whose rows changed.
+
+    Args:
+        retcom (RetCom): Page window.
+    """
+
+    # Queried for every row on each layout, so built once
+    groupFlags = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled
+    boxFlags = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEditable | QtCore.Qt.ItemIsDragEnabled
+
+    def __init__(self, retcom):
+        super(BoundingBoxModel, self).__init__(retcom)
+
+        self.retcom = retcom
+        self.headerLabel = ''
+
+        # Snapshot of the tree. Groups map to their boxes, and grouped
+        # boxes to their group.
+        self.rows = []
+        self.children = {}
+        self.parentOf = {}
+        self.objects = {}
+        self._rowOf = {}
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 1
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if not parent.isValid():
+            return len(self.rows)
+        elif parent.column() == 0:
+            return len(self.children.get(self.objectAt(parent), ()))
+        else:
+            return 0
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+
+        if parent.isValid():
+            obj = self.children[self.objectAt(parent)][row]
+        else:
+            obj = self.rows[row]
+
+        return self.createIndex(row, column, obj.uid)
+
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+
+        group = self.parentOf.get(self.objectAt(index))
+        if group is None:
+            return QtCore.QModelIndex()
+
+        return self.createIndex(self.rowOf(group), 0, group.uid)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.headerLabel
+
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.ItemIsDropEnabled
+
+        if hasattr(self.objectAt(index), 'isBboxGroup'):
+            return self.groupFlags
+        else:
+            return self.boxFlags
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        obj = self.objectAt(index)
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            return self.itemText(obj)
+        elif role == QtCore.Qt.BackgroundRole:
+            return self.textBackgroundColor(self.itemText(obj), getattr(obj, 'flagged', False))
+
+        return None
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if not index.isValid() or role != QtCore.Qt.EditRole:
+            return False
+
+        bbox = self.objectAt(index)
+        if hasattr(bbox, 'isBboxGroup') or not value:
+            return False
+
+        bbox.updateContent(value)
+        bbox.updateFill()
+        if bbox.group:
+            bbox.group.updateShape()
+
+        self.itemChanged(bbox)
+
+        return True
+
+    def supportedDropActions(self):
+        return QtCore.Qt.MoveAction
+
+    @staticmethod
+    def itemText(obj):
+        if hasattr(obj, 'isBboxGroup'):
+            return f'[[G{obj.number}]]'
+        else:
+            return obj.text
+
+    def textBackgroundColor(self, txt, flagged=False):
+        config = self.retcom.retcomconfig
+
+        if flagged:
+            flaggedColor = config.flaggedBoxColor
+            return QtGui.QColor(flaggedColor.red(), flaggedColor.green(), flaggedColor.blue(), round(config.boundingBoxOpacity*255))
+        elif txt == '␟':
+            fillerColor = config.fillerBoxColor
+            return QtGui.QColor(fillerColor.red(), fillerColor.green(), fillerColor.blue(), round(config.boundingBoxOpacity*255))
+        elif (txt[:2] == '[[') and (txt[-2:] == ']]'):
+            groupColor = config.groupBoxColor
+            return QtGui.QColor(groupColor.red(), groupColor.green(), groupColor.blue(), round(config.groupBoxOpacity*255))
+        else:
+            boundingColor = config.boundingBoxColor
+            return QtGui.QColor(boundingColor.red(), boundingColor.green(), boundingColor.blue(), round(config.boundingBoxOpacity*255))
+
+    def objectAt(self, index):
+        """Returns the group or box of an index."""
+        return self.objects.get(index.internalId())
+
+    def rowOf(self, obj):
+        parentObj = self.parentOf.get(obj)
+
+        rows = self._rowOf.get(parentObj)
+        if rows is None:
+            rows = self._rowOf[parentObj] = dict((o, row) for row, o in enumerate(self._list(parentObj)))
+
+        return rows[obj]
+
+    def indexOf(self, obj):
+        """Returns the index of a group or box, invalid if not shown."""
+        if obj is None or self.objects.get(obj.uid) is not obj:
+            return QtCore.QModelIndex()
+
+        return self.createIndex(self.rowOf(obj), 0, obj.uid)
+
+    def itemChanged(self, obj):
+        """Signals that the text or flag of a group or box changed."""
+        index = self.indexOf(obj)
+        if index.isValid():
+            self.dataChanged.emit(index, index)
+
+    def pageRows(self):
+        """Returns the current top-level rows and group members of the page."""
+        groups = list(self.retcom.groups)
+
+        children = {}
+        grouped = set()
+        for group in groups:
+            # Boxes regrouped without leaving their old group are only
+            # shown under the group they point to
+            children[group] = [bbox for bbox in group.items if bbox.group is group]
+            grouped.update(children[group])
+
+        rows = groups + [bbox for bbox in self.retcom.bboxes if bbox not in grouped]
+
+        return rows, children
+
+    def reset(self):
+        """Rebuilds the whole snapshot, e.g. after loading a page."""
+        self.beginResetModel()
+        self.rows, self.children = self.pageRows()
+        self.parentOf = dict((bbox, group) for group, items in self.children.items() for bbox in items)
+        self.objects = dict((obj.uid, obj) for obj in self.rows)
+        self.objects.update((bbox.uid, bbox) for bbox in self.parentOf)
+        self._rowOf = {}
+        self.endResetModel()
+
+    def sync(self):
+        """Updates the snapshot to the page, row by row."""
+        rows, children = self.pageRows()
+
+        if not self.rows:
+            self.reset()
+            return
+
+        # Take out everything that left its parent first, so no box is
+        # ever shown in two places
+        newRows = set(rows)
+        for group, items in list(self.children.items()):
+            if group in newRows:
+                members = set(children[group])
+                self._removeWhere(group, lambda obj: obj not in members)
+        self._removeWhere(None, lambda obj: obj not in newRows)
+
+        self._syncRows(None, rows)
+        for group in rows:
+            if group in children:
+                self._syncRows(group, children[group])
+
+    def _list(self, parentObj):
+        return self.rows if parentObj is None else self.children[parentObj]
+
+    def _parentIndex(self, parentObj):
+        if parentObj is None:
+            return QtCore.QModelIndex()
+
+        return self.createIndex(self.rowOf(parentObj), 0, parentObj.uid)
+
+    def _removeWhere(self, parentObj, condition):
+        objs = self._list(parentObj)
+
+        last = None
+        for row in range(len(objs) - 1, -2, -1):
+            if row >= 0 and condition(objs[row]):
+                if last is None:
+                    last = row
+            elif last is not None:
+                self._removeRows(parentObj, row + 1, last)
+                last = None
+
+    def _removeRows(self, parentObj, first, last):
+        objs = self._list(parentObj)
+
+        self.beginRemoveRows(self._parentIndex(parentObj), first, last)
+        for obj in objs[first:last + 1]:
+            self.parentOf.pop(obj, None)
+            self.objects.pop(obj.uid, None)
+            for bbox in self.children.pop(obj, ()):
+                self.parentOf.pop(bbox, None)
+                self.objects.pop(bbox.uid, None)
+            self._rowOf.pop(obj, None)
+        del objs[first:last + 1]
+        self._rowOf.pop(parentObj, None)
+        self.endRemoveRows()
+
+    def _insertRows(self, parentObj, row, new):
+        objs = self._list(parentObj)
+
+        self.beginInsertRows(self._parentIndex(parentObj), row, row + len(new) - 1)
+        objs[row:row] = new
+        for obj in new:
+            if parentObj is not None:
+                self.parentOf[obj] = parentObj
+            if hasattr(obj, 'isBboxGroup'):
+                self.children[obj] = []
+            self.objects[obj.uid] = obj
+        self._rowOf.pop(parentObj, None)
+        self.endInsertRows()
+
+    def _syncRows(self, parentObj, new):
+        old = self._list(parentObj)
+        if old == new:
+            return
+
+        opcodes = difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes()
+
+        # Removals from the back, then insertions from the front, which
+        # leaves the kept rows exactly where the new rows expect them
+        for tag, i1, i2, j1, j2 in reversed(opcodes):
+            if tag in ('delete', 'replace'):
+                self._removeRows(parentObj, i1, i2 - 1)
+
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag in ('insert', 'replace'):
+                self._insertRows(parentObj, j1, new[j1:j2])
+
+class BoundingBoxTree(QtWidgets.QTreeView):
     def __init__(self, parent):
         super(BoundingBoxTree, self).__init__(parent)
 
         self.parent = parent
-        self.fillTree()
-        # self.defaultColor = QtWidgets.QApplication.palette().text().color()
-        # self.defaultBrush = self.headerItem().backgroundColor(0)
-        self.defaultBrush = QtGui.QColor(255, 255, 255, 0)
-        self.setEditTriggers(QtWidgets.QTreeWidget.NoEditTriggers)
+        self.setModel(self.parent.boxModel)
+        self.setUniformRowHeights(True)
+        self.setEditTriggers(QtWidgets.QAbstractItemView.DoubleClicked)
         self.setSelectionMode(self.SingleSelection)
         # self.setDragEnabled(True)
         self.setDragDropOverwriteMode(False)
@@ -1560,100 +2625,45 @@ class BoundingBoxTree(QtWidgets.QTreeWidget):
         # self.setDragDropMode(QtWidgets.QAbstractItemView.InternalMove)
         self.setDragDropMode(QtWidgets.QAbstractItemView.DragDrop)
 
-        self.currentItemChanged.connect(self.onItemChange)
-        self.itemDoubleClicked.connect(self.onItemDoubleClicked)
-        self.currentItemChanged.connect(self.onCurrentItemChange)
+        self.selectionModel().currentChanged.connect(self.onCurrentChanged)
 
-    def textBackgroundColor(self, txt, flagged=False):
-        if flagged:
-            flaggedColor = self.parent.retcomconfig.flaggedBoxColor
-            return QtGui.QColor(flaggedColor.red(), flaggedColor.green(), flaggedColor.blue(), round(self.parent.retcomconfig.boundingBoxOpacity*255))
-        elif txt == '␟':
-            fillerColor = self.parent.retcomconfig.fillerBoxColor
-            return QtGui.QColor(fillerColor.red(), fillerColor.green(), fillerColor.blue(), round(self.parent.retcomconfig.boundingBoxOpacity*255))
-        elif (txt[:2] == '[[') and (txt[-2:] == ']]'):
-            groupColor = self.parent.retcomconfig.groupBoxColor
-            return QtGui.QColor(groupColor.red(), groupColor.green(), groupColor.blue(), round(self.parent.retcomconfig.groupBoxOpacity*255))
-        else:
-            boundingColor = self.parent.retcomconfig.boundingBoxColor
-            return QtGui.QColor(boundingColor.red(), boundingColor.green(), boundingColor.blue(), round(self.parent.retcomconfig.boundingBoxOpacity*255))
-            # return self.defaultBrush
-
-    def fillTree(self):
-        self.clear()
-
-        accountedFor = []
-        # print('*****')
-    
-        for groupNo in sorted(list(BoundingBoxGroup.groups[self.parent.scene].keys())):
-            if BoundingBoxGroup.groups[self.parent.scene][groupNo]:
-                bbgTreeItem = QtWidgets.QTreeWidgetItem(self)
-                text = f'[[G{groupNo}]]'
-                bbgTreeItem.setText(0, text)
-                bbgTreeItem.setFlags(bbgTreeItem.flags() | QtCore.Qt.ItemIsDropEnabled)
-                bbgTreeItem.setBackground(0, self.textBackgroundColor(text))
-
-                BoundingBoxGroup.groups[self.parent.scene][groupNo].treeItem = bbgTreeItem
-                for item in BoundingBoxGroup.groups[self.parent.scene][groupNo].items:
-                    # print(groupNo, item.text)
-                    bboxTreeItem = QtWidgets.QTreeWidgetItem(bbgTreeItem)
-                    bboxTreeItem.setText(0, item.text)
-                    bboxTreeItem.setBackground(0, self.textBackgroundColor(item.text, item.flagged))
-                    item.treeItem = bboxTreeItem
-                    bboxTreeItem.setFlags(bboxTreeItem.flags() | QtCore.Qt.ItemIsEditable)
-                    bboxTreeItem.setFlags(bboxTreeItem.flags() | QtCore.Qt.ItemIsDragEnabled)
-                    accountedFor.append(item)
-
-        # print('-----')
-
-        for item in self.parent.bboxes:
-            if item not in accountedFor:
-                # print(item.text)
-                bboxTreeItem = QtWidgets.QTreeWidgetItem(self)
-                bboxTreeItem.setText(0, item.text)
-                bboxTreeItem.setBackground(0, self.textBackgroundColor(item.text, item.flagged))
-                item.treeItem = bboxTreeItem
-                bboxTreeItem.setFlags(bboxTreeItem.flags() | QtCore.Qt.ItemIsEditable)
-                bboxTreeItem.setFlags(bboxTreeItem.flags() | QtCore.Qt.ItemIsDragEnabled)
-                accountedFor.append(item)
+    def syncTree(self):
+        self.model().sync()
+
+    def reveal(self, obj):
+        """Scrolls to a group or box and makes it current."""
+        index = self.model().indexOf(obj)
+        if index.isValid():
+            self.scrollTo(index)
+            self.setCurrentIndex(index)
 
     def dropEvent(self, event:QtGui.QDropEvent):
-        # print(event.proposedAction())
-        # print(event.posF())
-        # print(self.itemAt(event.pos()))
-        # print(self.itemAt(event.pos()).text(0))
-        source:QtWidgets.QTreeWidgetItem = self.currentItem()
-        dest:QtWidgets.QTreeWidgetItem = self.itemAt(event.pos())
-
-        if id(source) != id(dest):
-            # print('BEFORE')
-            # print([el.text for el in self.parent.bboxes])
-            # print(source)
-            sourceType, sourceBB = self.getBBObjectFromItem(source)
-            if sourceType == 'bbg':
+        source = self.currentIndex()
+        dest = self.indexAt(event.pos())
+
+        if source.isValid() and source != dest:
+            sourceBB = self.model().objectAt(source)
+            if hasattr(sourceBB, 'isBboxGroup'):
                 return
             else:
                 sourceBB:BoundingBox = sourceBB
 
             # dest is an item
-            if dest:
-                # print(source.text(0), dest.text(0))
-                destType, destBB = self.getBBObjectFromItem(dest)
+            if dest.isValid():
+                destBB = self.model().objectAt(dest)
                 # dest is BoundingBoxGroup
-                if destType == 'bbg':
+                if hasattr(destBB, 'isBboxGroup'):
                     destBB:BoundingBoxGroup = destBB
                     sourceGroup = sourceBB.group
                     if sourceGroup:
                         sourceGroup.remove(sourceBB)
 
+                    sourceBB.markDirty()
+                    destBB.markDirty()
                     sourceBB.group = destBB
                     destBB.items = [sourceBB] + destBB.items
                     destBB.updateShape()
 
-                    # print([hex(id(el)) for el in self.parent.bboxes])
-                    # print(hex(id(destBB.items[0])))
-                    # print(hex(id(sourceBB)))
-
                     self.parent.bboxes = self.insertBefore(self.parent.bboxes, destBB.items[0], sourceBB)
                 # dest is BoundingBox
                 else:
@@ -1668,18 +2678,13 @@ class BoundingBoxTree(QtWidgets.QTreeWidget):
                             if sourceGroup:
                                 sourceGroup.remove(sourceBB)
 
+                            sourceBB.markDirty()
                             sourceBB.group = destGroup
                             
-                        # idxOfDest = destGroup.items.index(destBB)
                         self.parent.bboxes = self.insertBefore(self.parent.bboxes, destBB, sourceBB)
-                        # print('BEFORE (dest w/ group)')
-                        # print([el.text for el in destGroup.items])
 
+                        destGroup.markDirty()
                         destGroup.items = self.insertBefore(destGroup.items, destBB, sourceBB)
-
-                        # print('AFTER (dest w/ group)')
-                        # print([el.text for el in destGroup.items])
-                        # destGroup.items.insert(min(0, idxOfDest-1), sourceBB)
                         
                         destGroup.updateShape()
 
@@ -1693,90 +2698,26 @@ class BoundingBoxTree(QtWidgets.QTreeWidget):
                         self.parent.bboxes = self.insertBefore(self.parent.bboxes, destBB, sourceBB)
             # dest is root
             else:
-                # print(source.text(0), None)
                 sourceGroup:BoundingBoxGroup = sourceBB.group
                 if sourceGroup:
                     sourceGroup.remove(sourceBB)
                     sourceGroup.updateShape()
-                
-            # print('AFTER')
-            # print([el.text for el in self.parent.bboxes])
             
-            self.fillTree()
+            self.syncTree()
 
             selectedItems = self.parent.scene.selectedItems()
             if len(selectedItems) == 1:
-                if selectedItems[0].treeItem:
-                    self.parent.bboxSettings.bbTree.scrollToItem(selectedItems[0].treeItem)
-                    self.parent.bboxSettings.bbTree.setCurrentItem(selectedItems[0].treeItem)
+                self.reveal(selectedItems[0])
             elif len(selectedItems) > 1:
                 if selectedItems[0].group:
-                    if selectedItems[0].group.treeItem:
-                        self.parent.bboxSettings.bbTree.scrollToItem(selectedItems[0].group.treeItem)
-                        self.parent.bboxSettings.bbTree.setCurrentItem(selectedItems[0].group.treeItem)
-
-    def getBBObjectFromItem(self, item):
-        if item.parent():
-            try:
-                groupNo = int(item.parent().text(0).replace('[[', '').replace(']]', '').replace('G', ''))
-            except ValueError:
-                groupNo = None
-
-            if groupNo:
-                group = BoundingBoxGroup.groups[self.parent.scene][groupNo]
-                bbox = None
-                for bboxCandidate in group.items:
-                    if id(bboxCandidate.treeItem) == id(item):
-                        bbox = bboxCandidate
-                        break
-
-                return 'bbox', bbox
-        else:
-            try:
-                groupNo = int(item.text(0).replace('[[', '').replace(']]', '').replace('G', ''))
-            except ValueError:
-                groupNo = None
-
-            if groupNo:
-                group = BoundingBoxGroup.groups[self.parent.scene][groupNo]
-
-                return 'bbg', group
-            else:
-                bbox = None
-                for bboxCandidate in self.parent.bboxes:
-                    if id(bboxCandidate.treeItem) == id(item):
-                        bbox = bboxCandidate
-                        break
-
-                return 'bbox', bbox
-
-    @staticmethod
-    def indexById(l, a):
-        hid = hex(id(a))
-
-        for idx, el in enumerate(l):
-            if hex(id(el)) == hid:
-                return idx
-
-        return None
-
-    # @staticmethod
-    # def insertBefore(l, a, b):
-    #     ib = BoundingBoxTree.indexById(l, b)
-    #     l.remove(b)
-    #     ia = BoundingBoxTree.indexById(l, a)
-    #     if ia:
-    #         if ia >= ib-1:
-    #             l.insert(ia, b)
-    #         else:
-    #             l.insert(min(0, ia-1), b)
-    #     else:
-    #         l.insert(ib, b)
-        
-    #     return l
+                    self.reveal(selectedItems[0].group)
 
     @staticmethod
     def insertBefore(l, a, b):
+        if isinstance(l, BoxList):
+            l.insertBefore(a, b)
+            return l
+
         ia = l.index(a)
         try:
             ib = l.index(b)
@@ -1800,101 +2741,20 @@ class BoundingBoxTree(QtWidgets.QTreeWidget):
         l[ib] = a
 
         return l
-        
 
     @QtCore.Slot()
-    def onItemChange(self):
-        item = self.currentItem()
-
-        if item:
+    def onCurrentChanged(self, current, previous):
+        if current.isValid():
             self.parent.scene.clearSelection()
 
-            if item.parent():
-                group = BoundingBoxGroup.groups[self.parent.scene][int(item.parent().text(0).replace('[[', '').replace(']]', '').replace('G', ''))]
-                bbox = group.items[item.parent().indexOfChild(item)]
-                bbox.setSelected(True)
+            obj = self.model().objectAt(current)
+            if hasattr(obj, 'isBboxGroup'):
+                obj.selectGroupMembers()
             else:
-                txt = item.text(0)
-                if (txt[:2] == '[[') and (txt[-2:] == ']]'):
-                    group = BoundingBoxGroup.groups[self.parent.scene][int(item.text(0).replace('[[', '').replace(']]', '').replace('G', ''))]
-                    group.selectGroupMembers()
-                else:
-                    bbType, bbox = self.getBBObjectFromItem(item)
-                    
-                    if bbox:
-                        if bbType == 'bbox':
-                            bbox:BoundingBox = bbox
-                            # bboxesGroupless = [el for el in self.parent.bboxes if not el.group]
-                            # print(self.topLevelItem(0).indexOfChild(item), BoundingBoxGroup.groupNo[self.parent.scene])
-                            # bbox = bboxesGroupless[self.topLevelItem(0).indexOfChild(item) + BoundingBoxGroup.groupNo[self.parent.scene]]
-                            # print(bbox.text)
-                            bbox.setSelected(True)
+                obj.setSelected(True)
 
         self.viewport().update()
 
-    @QtCore.Slot()
-    def onItemDoubleClicked(self, item, column):
-        if item.parent():
-            if column == 0:
-                self.editItem(item, column)
-        else:
-            if column == 0 and item.text(0)[:2] != '[[' and item.text(0)[-2:] != ']]':
-                self.editItem(item, column)
-
-    # def mousePressEvent(self, event):
-    #     if event.button() == QtCore.Qt.RightButton:
-    #         item = self.currentItem()
-    #         if item:
-    #             txt = item.text(0)
-    #             if (txt[:2] == '[[') and (txt[-2:] == ']]'):                    
-    #                 groupNo = int(item.text(0).replace('[[', '').replace(']]', '').replace('G', ''))
-    #                 group = BoundingBoxGroup.groups[self.parent.scene][groupNo]
-
-    #                 menu = QtWidgets.QMenu()
-
-    #                 collateTextAction = QtWidgets.QAction('Collate', self.parent)
-    #                 collateTextAction.setStatusTip('Collate text')
-    #                 collateTextAction.triggered.connect(self.collateText)
-
-    #                 menu.addAction(collateTextAction)
-    #                 menu.exec_(event.screenPos())
-
-    @QtCore.Slot()
-    def onCurrentItemChange(self, current, previous):
-        if current:
-            currText = current.text(0)
-
-            flagged = False
-
-            if current.parent():
-                group = BoundingBoxGroup.groups[self.parent.scene][int(current.parent().text(0).replace('[[', '').replace(']]', '').replace('G', ''))]
-                bbox = group.items[current.parent().indexOfChild(current)]
-                # self.parent.simpleText.setHtml(f"<span style='background-color:white;color:black;'>{currText}</span>")
-                # self.parent.bboxSettings.bbText.setText(currText)
-                bbox.updateContent(currText)
-                bbox.updateFill()
-                if bbox.group:
-                    bbox.group.updateShape()
-
-                flagged = bbox.flagged
-            elif currText[:2] != '[[' and currText[-2:] != ']]':
-                bbType, bbox = self.getBBObjectFromItem(current)
-
-                if bbox:
-                    if bbType == 'bbox':
-                        bbox:BoundingBox = bbox
-
-                        bbox.updateContent(currText)
-                        bbox.updateFill()
-                        if bbox.group:
-                            bbox.group.updateShape()
-
-                        flagged = bbox.flagged
-
-            current.setBackground(0, self.textBackgroundColor(currText, flagged))
-
-
-
 
 class BoundingBoxSettings(QtWidgets.QDockWidget):
     def __init__(self, parent):
@@ -1907,9 +2767,11 @@ class BoundingBoxSettings(QtWidgets.QDockWidget):
         self.fileName = os.path.split(self.parent.imagePath)[-1]
 
         self.setWindowTitle(f'Bounding Box Overview | {self.fileName}')
-        self.bbTree.setHeaderLabel(self.fileName)
+        self.parent.boxModel.headerLabel = self.fileName
         self.bbTree.header().setStretchLastSection(False)
         self.bbTree.header().setSectionResizeMode(QtWidgets.QHeaderView.ResizeToContents)
+        # Only measure the visible rows, not the whole page
+        self.bbTree.header().setResizeContentsPrecision(0)
 
         self.usButton = QtWidgets.QPushButton('Copy unit separator')
         self.usButton.clicked.connect(self.copyUSEvent)
@@ -2035,6 +2897,10 @@ class TranslationDialog(QtWidgets.QDockWidget):
 
         self.fetchCollationButton = QtWidgets.QPushButton('Fetch collation')
         self.translateButton = QtWidgets.QPushButton('Translate')
+        self.typesetButton = QtWidgets.QPushButton('Typeset')
+
+        # Group numbers of the collated paragraphs, in order
+        self.groupNumbers = []
 
         self.translationTextEdit = QtWidgets.QTextEdit()
 
@@ -2046,6 +2912,7 @@ class TranslationDialog(QtWidgets.QDockWidget):
 
         self.gridLayout.addWidget(self.fetchCollationButton, 0, 0)
         self.gridLayout.addWidget(self.translateButton, 0, 1)
+        self.gridLayout.addWidget(self.typesetButton, 0, 2)
         self.layout.addLayout(self.gridLayout)
 
         self.layout.addWidget(self.translationTextEdit, 0, QtCore.Qt.AlignCenter)
@@ -2054,6 +2921,7 @@ class TranslationDialog(QtWidgets.QDockWidget):
 
         self.fetchCollationButton.clicked.connect(self.fetchCollation)
         self.translateButton.clicked.connect(self.translate)
+        self.typesetButton.clicked.connect(self.typeset)
 
         self.fetchCollation()
 
@@ -2062,29 +2930,51 @@ class TranslationDialog(QtWidgets.QDockWidget):
     @QtCore.Slot()
     def fetchCollation(self):
         collation = []
-        for groupNo in sorted(list(BoundingBoxGroup.groups[self.parent.scene].keys())):
-            if BoundingBoxGroup.groups[self.parent.scene][groupNo]:
-                lines = []
-                for bbox in BoundingBoxGroup.groups[self.parent.scene][groupNo].items:
-                    text = bbox.text
-                    if text != '␟':
-                        lines.append(text)
-
-                line = self.parent.retcomconfig.collationString.join(lines)
-                collation.append(line)
+        self.groupNumbers = []
+        for groupNo, group in self.parent.groups.items():
+            collation.append(group.collate())
+            self.groupNumbers.append(groupNo)
 
         self.collationTextEdit.setText('\n\n'.join(collation))
 
     @QtCore.Slot()
     def translate(self):
-        sourceText = self.collationTextEdit.toPlainText()
-        # print(sourceText)
-        destText = self.parent.translator.translate(sourceText, detailed=True, target=self.parent.retcomconfig.translationLanguage)
+        # Paragraphs are translated as separate segments, so each group
+        # gets its own translation back
+        segments = self.collationTextEdit.toPlainText().split('\n\n')
+        try:
+            translations = self.parent.translator.translateBatch(segments, target=self.parent.retcomconfig.translationLanguage)
+        except TranslationError as e:
+            QtWidgets.QMessageBox.warning(self, 'Translation', str(e))
+            return
 
-        # print()
-        # print(destText)
-        
-        self.translationTextEdit.setText(destText['resp'])
+        self.translationTextEdit.setText('\n\n'.join(translations))
+        self.assignTranslations()
+
+    def assignTranslations(self):
+        """Hands each translated paragraph to its group.
+
+        Returns:
+            False if the paragraphs no longer match the collated groups.
+        """
+        paragraphs = [paragraph.strip() for paragraph in self.translationTextEdit.toPlainText().split('\n\n')]
+        if len(paragraphs) != len(self.groupNumbers):
+            return False
+
+        for groupNo, paragraph in zip(self.groupNumbers, paragraphs):
+            group = self.parent.groups.get(groupNo)
+            if group:
+                group.translation = paragraph
+
+        return True
+
+    @QtCore.Slot()
+    def typeset(self):
+        if not self.assignTranslations():
+            QtWidgets.QMessageBox.warning(self, 'Typeset', f'Expected {len(self.groupNumbers)} paragraphs separated by blank lines, one per group.')
+            return
+
+        self.parent.typesetPageEvent()
 
 class InfoDialog(QtWidgets.QDockWidget):
     def __init__(self, parent):
@@ -2145,45 +3035,46 @@ class InfoDialog(QtWidgets.QDockWidget):
         self.avgHeightText.setText(f'Avg. height: {int(h)}px')
 
 class BoundingEllipse(QtWidgets.QGraphicsEllipseItem):
+    # Shared by all ellipses until set on one
+    isBell = True
+    flagged = False
+    color = QtGui.QColor(QtCore.Qt.black)
+    y0 = 0
+    margin = 5
+
+    # Fitted text is re-fitted from its unbroken source on resize
+    autoFit = False
+    fitSource = None
+
+    origX = GeometryField(0)
+    origY = GeometryField(1)
+    origW = GeometryField(2)
+    origH = GeometryField(3)
+    actualW = GeometryField(4)
+    actualH = GeometryField(5)
+
     def __init__(self, x=0, y=0, w=100, h=100, parent=None):
         super(BoundingEllipse, self).__init__(0,0, w,h)
         self.setPos(x, y)
 
         self.parent = parent
 
-        self.actualW = w
-        self.actualH = h
-
-        self.currentW = w
-        self.currentH = h
-
-        self.origX = x
-        self.origY = y
-        self.origW = w
-        self.origH = h
-
-        self.sceneX = x
-        self.sceneY = y
-
-        self.y0 = 0
-        self.margin = 5
+        self.geometry = array('d', (x, y, w, h, w, h))
 
         self.origText = None
         self.text = None
         self._fontSize = 25
-        self.displayTextItem = QtWidgets.QGraphicsTextItem('', self)
-        self.color = QtCore.Qt.black
+        self._fontFamily = 'Wild Words'
+
+        # Not a child of the ellipse, so the text stays visible when the
+        # ellipse is hidden for previews and exports
+        self.displayTextItem = QtWidgets.QGraphicsTextItem('')
         self.displayTextItem.setDefaultTextColor(self.color)
-        self.displayTextItem.setPos(self.sceneX, self.sceneY)
+        self.displayTextItem.setPos(x, y)
         self.displayTextItem.setTextWidth(self.boundingRect().width())
+        self.displayTextItem.setFont(self.font)
         self.displayText = ''
 
-        self.font = QtGui.QFont('Wild Words')
-        self.fontSize = 25
-
-        self.isBell = True
-        self.flagged = False
-
         self.parent.scene.addItem(self.displayTextItem)
 
         self.setFlag(QtWidgets.QGraphicsItem.ItemSendsGeometryChanges)
@@ -2200,10 +3091,43 @@ class BoundingEllipse(QtWidgets.QGraphicsEllipseItem):
 
     @fontSize.setter
     def fontSize(self, size):
+        self.markDirty()
         self._fontSize = abs(size)
-        self.font.setPixelSize(self._fontSize)
         self.displayTextItem.setFont(self.font)
 
+    @property
+    def fontFamily(self):
+        return self._fontFamily
+
+    @fontFamily.setter
+    def fontFamily(self, family):
+        self.markDirty()
+        self._fontFamily = family
+        self.displayTextItem.setFont(self.font)
+
+    @property
+    def font(self):
+        """Font of the text, shared by all ellipses of the same font
+        family and size. Set `fontFamily` and `fontSize` to change it.
+        """
+        return self.parent.retcomconfig.qtFont(self._fontFamily, self._fontSize)
+
+    @property
+    def currentW(self):
+        return self.rect().width()
+
+    @property
+    def currentH(self):
+        return self.rect().height()
+
+    @property
+    def sceneX(self):
+        return self.sceneBoundingRect().left()
+
+    @property
+    def sceneY(self):
+        return self.sceneBoundingRect().top()
+
     @property
     def text(self):
         return self._text
@@ -2223,6 +3147,7 @@ class BoundingEllipse(QtWidgets.QGraphicsEllipseItem):
 
     @displayText.setter
     def displayText(self, txt):
+        self.markDirty()
         self._displayText = txt
         txtFormatted = self.displayText.replace('\n', '<br>')
         self.displayTextItem.setHtml(f'<p style="margin: {self.margin}px; text-align: center; -webkit-text-stroke: 3px #fff; -webkit-text-fill-color: #000;">{txtFormatted}</p>')
@@ -2241,20 +3166,27 @@ class BoundingEllipse(QtWidgets.QGraphicsEllipseItem):
         else:
             return self.origW/self.origH
 
+    def markDirty(self):
+        # Items that are still being set up are not tracked yet
+        if self.scene() is not None:
+            self.parent.journal.markDirty(self)
+
     def removeSelected(self):
+        self.parent.journal.markRemoved(self)
         self.parent.scene.removeItem(self)
 
         selectedItems = self.parent.scene.selectedItems()
         if len(selectedItems) > 1:
-            for item in self.parent.scene.items():
-                if hasattr(item, 'isBbox'):
-                    if item in selectedItems:
-                        self.parent.scene.removeItem(item)
-                        self.parent.bboxes.remove(item)
-                        if item.group:
-                            group = item.group
-                            item.group.remove(item)
-                            group.updateShape()
+            boxes = self.parent.sceneIndex.items('box')
+            for item in selectedItems:
+                if item in boxes:
+                    self.parent.journal.markRemoved(item)
+                    self.parent.scene.removeItem(item)
+                    self.parent.bboxes.remove(item)
+                    if item.group:
+                        group = item.group
+                        item.group.remove(item)
+                        group.updateShape()
 
     def restoreSelected(self):
         self.setPos(self.origX, self.origY)
@@ -2263,12 +3195,12 @@ class BoundingEllipse(QtWidgets.QGraphicsEllipseItem):
 
         selectedItems = self.parent.scene.selectedItems()
         if len(selectedItems) > 1:
-            for item in self.parent.scene.items():
-                if hasattr(item, 'isBbox'):
-                    if item in selectedItems:
-                        item.setPos(item.origX, item.origY)
-                        item.updateContent(item.origText)
-                        item.updateFill()
+            boxes = self.parent.sceneIndex.items('box')
+            for item in selectedItems:
+                if item in boxes:
+                    item.setPos(item.origX, item.origY)
+                    item.updateContent(item.origText)
+                    item.updateFill()
 
     def contextMenuEvent(self, event):
         menu = QtWidgets.QMenu()
@@ -2293,45 +3225,104 @@ class BoundingEllipse(QtWidgets.QGraphicsEllipseItem):
         capitalizeAction.setStatusTip('Capitalize text')
         capitalizeAction.triggered.connect(self.capitalizeEvent)
 
+        fitAction = QtWidgets.QAction('Fit text to bubble', self.parent)
+        fitAction.setStatusTip('Pick the largest font size and line breaks that fit the bubble')
+        fitAction.triggered.connect(self.fitEvent)
+
+        autoFitAction = QtWidgets.QAction('Auto-fit text', self.parent)
+        autoFitAction.setStatusTip('Fit text to bubble whenever it is resized')
+        autoFitAction.setCheckable(True)
+        autoFitAction.setChecked(self.autoFit)
+        autoFitAction.toggled.connect(self.autoFitEvent)
+
         menu.addAction(changeTextAction)
         menu.addAction(changeFontSizeAction)
         menu.addAction(changeFontFamilyAction)
         menu.addAction(changeFontColorAction)
         menu.addAction(capitalizeAction)
+        menu.addSeparator()
+        menu.addAction(fitAction)
+        menu.addAction(autoFitAction)
         menu.exec_(event.screenPos())
 
     def changeTextEvent(self):
         txt, resp = QtWidgets.QInputDialog.getMultiLineText(self.parent, 'Textbox text', 'Text:', self.displayText)
         if txt:
+            self.fitSource = None
             self.displayText = txt
+            if self.autoFit:
+                self.fitContents()
             self.alignContents()
 
     def changeFontSizeEvent(self):
         size, resp = QtWidgets.QInputDialog.getInt(self.parent, 'Font size', 'Font size in px:', self.fontSize)
         if size:
             self.fontSize = abs(size)
-            self.font.setPixelSize(self.fontSize)
-            self.displayTextItem.setFont(self.font)
             self.alignContents()
 
     def changeFontFamilyEvent(self):
-        family, resp = QtWidgets.QInputDialog.getText(self.parent, 'Font family', 'Font family:', text=self.font.family())
+        family, resp = QtWidgets.QInputDialog.getText(self.parent, 'Font family', 'Font family:', text=self.fontFamily)
         if family:
-            self.font.setFamily(family)
-            self.displayTextItem.setFont(self.font)
+            self.fontFamily = family
             self.alignContents()
 
     def changeFontColorEvent(self):
         color = QtWidgets.QColorDialog.getColor(self.color, title='Choose font color')
         if color:
+            self.markDirty()
             self.color = color
             self.displayTextItem.setDefaultTextColor(self.color)
             self.alignContents()
 
     def capitalizeEvent(self):
+        if self.fitSource is not None:
+            self.fitSource = self.fitSource.upper()
         self.displayText = self.displayText.upper()
         self.alignContents()
 
+    def fitEvent(self):
+        if not self.fitContents():
+            self.parent.statusBar().showMessage('Text does not fit the bubble, even at the minimum font size.')
+        self.alignContents()
+
+    def autoFitEvent(self, checked):
+        self.autoFit = checked
+        if checked:
+            self.fitEvent()
+
+    def fitContents(self):
+        """Fits the text to the ellipse.
+
+        Picks the largest font size and line breaks at which the text fits
+        within the ellipse, measured with the metrics of the current font
+        family. The unbroken text is kept, so repeated fits (e.g. on
+        resize) start over from the original lines.
+
+        Returns:
+            True if the text fits at some font size.
+        """
+        source = self.fitSource if self.fitSource is not None else self.displayText
+        if not source.strip():
+            return False
+
+        fontGeom = self.parent.retcomconfig.fontRegistry.geomForFamily(self.fontFamily)
+        if fontGeom is None:
+            fontGeom = self.parent.fontGeom
+        if fontGeom is None:
+            return False
+
+        margin = self.margin + self.displayTextItem.document().documentMargin()
+        fit = self.parent.retcomconfig.bubbleLayout.fit(source, fontGeom, self.currentW, self.currentH, margin)
+        if fit is None:
+            return False
+
+        size, lines = fit
+        self.fontSize = size
+        self.displayText = '\n'.join(lines)
+        self.fitSource = source
+
+        return True
+
     def mousePressEvent(self, event):
         self.parent.clickChanged = True
         
@@ -2363,7 +3354,10 @@ class BoundingEllipse(QtWidgets.QGraphicsEllipseItem):
             rc = self.parent
 
             if rc.fontGeom:
-                ar = rc.fontGeom.getTextAspectRatio(txt)*rc.lengthBias
+                if rc.verticalText:
+                    ar = rc.fontGeom.getTextAspectRatio(txt, order='h/w', vertical=True)*rc.lengthBias
+                else:
+                    ar = rc.fontGeom.getTextAspectRatio(txt)*rc.lengthBias
             else:
                 ar = rc.charAspectRatio*len(txt)*rc.lengthBias
 
@@ -2391,28 +3385,36 @@ class BoundingEllipse(QtWidgets.QGraphicsEllipseItem):
 
 
     def resize(self, w, h):
-        self.currentW = w
-        self.currentH = h
+        self.markDirty()
 
         self.prepareGeometryChange()
         self.setRect(self.rect().adjusted(0,0, w-self.rect().width(),h-self.rect().height()))
+        self.parent.sceneIndex.move(self, indexRect(self))
         self.displayTextItem.setTextWidth(self.boundingRect().width())
+        if self.autoFit:
+            self.fitContents()
         self.alignContents()
         self.update()
 
     def alignContents(self):
-        topLeft = self.sceneBoundingRect().topLeft()
-        self.sceneX = topLeft.x()
-        self.sceneY = topLeft.y()
         self.displayTextItem.setPos(self.sceneX, self.sceneY + self.y0 + round(self.currentH - self.displayTextItem.sceneBoundingRect().height())/2)
 
     def itemChange(self, change, value):
         if change == QtWidgets.QGraphicsItem.ItemPositionChange:
-            self.alignContents()
+            self.markDirty()
             # print('item pos change')
             # if self.group:
             #     # print('updating shape...')
             #     self.group.updateShape()
+        elif change == QtWidgets.QGraphicsItem.ItemPositionHasChanged:
+            self.alignContents()
+            self.parent.sceneIndex.move(self, indexRect(self))
+        elif change == QtWidgets.QGraphicsItem.ItemSceneHasChanged:
+            if self.scene() is not None:
+                self.parent.sceneIndex.add(self, 'ell', indexRect(self))
+            else:
+                self.parent.sceneIndex.remove(self)
+                self.parent.selection.discard(self)
 
         return value
 
@@ -2450,10 +3452,9 @@ def runTesseractScan(path, tessdata, lang='jpn_vert'):
 if __name__ == "__main__":
     app = QtWidgets.QApplication([])
 
-    translator = Translator(['translate.google.com'])
-
     retcomconfig = RetComConfig()
-    QtGui.QFontDatabase.addApplicationFont(os.path.normpath(os.path.join(retcomconfig.fontPath, 'NotoSansMono-Regular.ttf')))
+
+    translator = retcomconfig.createTranslator()
 
     RetCom.openRetCom(retcomconfig, translator)
 
@@ -0,0 +1,136 @@
+from collections import defaultdict
+
+class SceneIndex(object):
+    """Index of the boxes, groups and ellipses of a scene.
+
+    Items are kept in one set per kind, so code that needs every item of
+    a kind does not have to scan and type-check all scene items. Items
+    added with a rect are also hashed into a uniform grid, which answers
+    rect queries by only looking at the cells the rect overlaps.
+
+    Rects are `(left, top, right, bottom)` tuples in scene coordinates.
+
+    Args:
+        cellSize (float): Side of a grid cell. Works best at about the
+            size of a typical box.
+    """
+
+    def __init__(self, cellSize=64):
+        self.cellSize = cellSize
+
+        self._kinds = defaultdict(set)
+        self._kindOf = {}
+        self._rects = {}
+        self._cells = defaultdict(set)
+
+    def __contains__(self, item):
+        return item in self._kindOf
+
+    def __len__(self):
+        return len(self._kindOf)
+
+    def kind(self, item):
+        return self._kindOf.get(item)
+
+    def items(self, *kinds):
+        """Returns the items of the given kinds, as a set."""
+        if len(kinds) == 1:
+            return set(self._kinds[kinds[0]])
+
+        items = set()
+        for kind in kinds:
+            items.update(self._kinds[kind])
+
+        return items
+
+    def add(self, item, kind, rect=None):
+        if item in self._kindOf:
+            self.remove(item)
+
+        self._kindOf[item] = kind
+        self._kinds[kind].add(item)
+
+        if rect is not None:
+            self._insert(item, rect)
+
+    def remove(self, item):
+        kind = self._kindOf.pop(item, None)
+        if kind is None:
+            return
+
+        self._kinds[kind].discard(item)
+        if item in self._rects:
+            self._erase(item)
+
+    def move(self, item, rect):
+        """Updates the rect of an indexed item."""
+        if item not in self._kindOf:
+            return
+
+        old = self._rects.get(item)
+        if old == rect:
+            return
+
+        if old is not None:
+            if self._span(old) == self._span(rect):
+                self._rects[item] = rect
+                return
+
+            self._erase(item)
+
+        self._insert(item, rect)
+
+    def query(self, rect, *kinds):
+        """Returns the items whose rect intersects `rect`.
+
+        Args:
+            rect (tuple): Query rect.
+            kinds (str): If given, only items of these kinds are returned.
+        """
+        left, top, right, bottom = rect
+        x0, y0, x1, y1 = self._span(rect)
+
+        seen = set()
+        found = []
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                for item in self._cells.get((cx, cy), ()):
+                    if item in seen:
+                        continue
+                    seen.add(item)
+
+                    l, t, r, b = self._rects[item]
+                    if l <= right and left <= r and t <= bottom and top <= b:
+                        if not kinds or self._kindOf[item] in kinds:
+                            found.append(item)
+
+        return found
+
+    def clear(self):
+        self._kinds.clear()
+        self._kindOf.clear()
+        self._rects.clear()
+        self._cells.clear()
+
+    def _span(self, rect):
+        s = self.cellSize
+        left, top, right, bottom = rect
+
+        return int(left//s), int(top//s), int(right//s), int(bottom//s)
+
+    def _insert(self, item, rect):
+        self._rects[item] = rect
+
+        x0, y0, x1, y1 = self._span(rect)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self._cells[(cx, cy)].add(item)
+
+    def _erase(self, item):
+        x0, y0, x1, y1 = self._span(self._rects.pop(item))
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = self._cells[(cx, cy)]
+                cell.discard(item)
+                if not cell:
+                    del self._cells[(cx, cy)]
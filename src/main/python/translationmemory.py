@@ -0,0 +1,157 @@
+import os
+import re
+import json
+import difflib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+WHITESPACE = re.compile(r'\s+')
+
+# Bump when the layout of the memory file changes
+MEMORY_VERSION = 1
+
+def normalize(text):
+    """Normalizes text for lookups, folding width variants and spacing."""
+    return WHITESPACE.sub(' ', unicodedata.normalize('NFKC', text)).strip()
+
+class TranslationMemory(object):
+    """Local translation memory with LRU eviction.
+
+    Translations are keyed by normalized source text, source and target
+    language, and backend. Exact lookups are a single dict access. With
+    fuzzy matching enabled, misses fall back to the most similar stored
+    source of about the same length, so OCR variants of a line that was
+    already translated need no request either.
+
+    The memory is loaded from disk on first use and written back by
+    `save`.
+
+    Args:
+        path (str): Memory file. If `None`, nothing is persisted.
+        capacity (int): Maximum number of stored translations.
+        fuzziness (float): Minimum similarity ratio, between 0 and 1, of
+            a fuzzy match. Fuzzy matching is disabled if 0.
+    """
+
+    def __init__(self, path=None, capacity=20000, fuzziness=0):
+        self.path = path
+        self.capacity = capacity
+        self.fuzziness = fuzziness
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = None
+        self._changed = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load())
+
+    @staticmethod
+    def key(text, source, target, backend):
+        return '\x1f'.join([source, target, backend, normalize(text)])
+
+    def get(self, text, source, target, backend):
+        """Returns a stored translation, or `None`."""
+        key = self.key(text, source, target, backend)
+
+        with self._lock:
+            entries = self._load()
+
+            if key in entries:
+                entries.move_to_end(key)
+                self.hits += 1
+                return entries[key]
+
+            if self.fuzziness:
+                match = self._fuzzyMatch(key)
+                if match is not None:
+                    entries.move_to_end(match)
+                    self.hits += 1
+                    return entries[match]
+
+            self.misses += 1
+            return None
+
+    def put(self, text, source, target, backend, translation):
+        key = self.key(text, source, target, backend)
+
+        with self._lock:
+            entries = self._load()
+
+            entries[key] = translation
+            entries.move_to_end(key)
+            while len(entries) > self.capacity:
+                entries.popitem(last=False)
+
+            self._changed = True
+
+    def _fuzzyMatch(self, key):
+        prefix, _, text = key.rpartition('\x1f')
+        prefix += '\x1f'
+        lower, upper = len(text)*self.fuzziness, len(text)/self.fuzziness
+
+        matcher = difflib.SequenceMatcher(autojunk=False)
+        matcher.set_seq2(text)
+
+        best, bestRatio = None, self.fuzziness
+        for candidate in reversed(self._entries):
+            if not candidate.startswith(prefix):
+                continue
+
+            other = candidate[len(prefix):]
+            if not lower <= len(other) <= upper:
+                continue
+
+            matcher.set_seq1(other)
+            if matcher.real_quick_ratio() < bestRatio or matcher.quick_ratio() < bestRatio:
+                continue
+
+            ratio = matcher.ratio()
+            if ratio >= bestRatio:
+                best, bestRatio = candidate, ratio
+
+        return best
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = OrderedDict()
+
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, encoding="utf8") as f:
+                        data = json.load(f)
+
+                    if data.get('version') == MEMORY_VERSION:
+                        self._entries.update(data['entries'])
+                except (OSError, ValueError, KeyError):
+                    pass
+
+        return self._entries
+
+    def save(self):
+        """Writes the memory back to disk, if it changed."""
+        if not self.path:
+            return
+
+        with self._lock:
+            if not self._changed:
+                return
+
+            data = {'version' : MEMORY_VERSION, 'entries' : list(self._entries.items())}
+
+            try:
+                head, _ = os.path.split(self.path)
+                if head:
+                    os.makedirs(head, exist_ok=True)
+
+                with open(self.path + '.tmp', 'w', encoding="utf8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(self.path + '.tmp', self.path)
+
+                self._changed = False
+            except OSError:
+                pass
@@ -0,0 +1,229 @@
+import os
+import json
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import rarfile
+
+from parse_lstmbox import LSTMBox
+from translator import Translator, BACKENDS, createTranslator
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff')
+
+def archivePages(path, boxPath='box'):
+    """Lists the pages of an archive and their sidecar base paths.
+
+    Pages are extracted next to the archive as `rctemp_<member>` when
+    opened, so their sidecars live in the box folder under that name.
+
+    Returns:
+        A sorted list of `(member, basePath)` tuples.
+    """
+    if path.lower().endswith(('.rar', '.cbr')):
+        archive = rarfile.RarFile(path)
+    else:
+        archive = zipfile.ZipFile(path)
+
+    with archive:
+        members = sorted(f for f in archive.namelist() if '__MACOSX' not in f and f.lower().endswith(IMAGE_EXTENSIONS))
+
+    head, _ = os.path.split(path)
+    pages = []
+    for member in members:
+        imagePath = os.path.join(head, 'rctemp_' + member)
+        imageHead, imageTail = os.path.split(imagePath)
+        pages.append((member, os.path.normpath(os.path.join(imageHead, boxPath, imageTail))))
+
+    return pages
+
+def collateGroups(boxPath, collationString=''):
+    """Collates the text of every group in an LSTMBox sidecar.
+
+    Returns:
+        A dict mapping group numbers to their collated text, in group
+        order.
+    """
+    lines = {}
+    for txt, coords in LSTMBox(boxPath).boxList:
+        n = coords[-1]
+        if n != 0 and txt != '␟':
+            lines.setdefault(n, []).append(txt)
+
+    return dict((n, collationString.join(lines[n])) for n in sorted(lines))
+
+def translationPath(basePath):
+    return basePath + '.py.trn'
+
+def loadTranslations(basePath, target=None):
+    """Reads the translations of a page, stored by `TranslationScheduler`.
+
+    Args:
+        basePath (str): Sidecar base path.
+        target (str): If given, only translations into this language
+            are returned.
+
+    Returns:
+        A dict mapping group numbers to translations. Empty if there are
+        none, or if the box file changed after translating.
+    """
+    try:
+        with open(translationPath(basePath), encoding="utf8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if target and data.get('target') != target:
+        return {}
+
+    boxPath = basePath + '.py.box'
+    if not os.path.exists(boxPath) or data.get('stamp') != boxStamp(boxPath):
+        return {}
+
+    return dict((int(n), text) for n, text in data.get('groups', {}).items())
+
+def boxStamp(path):
+    stat = os.stat(path)
+
+    return [stat.st_mtime, stat.st_size]
+
+class TranslationScheduler(object):
+    """Translates every page of an archive concurrently.
+
+    Each page with an LSTMBox sidecar is translated as one batch of its
+    groups, and pages are spread over a thread pool. Requests are rate
+    limited by the translator itself, so the limit holds across pages.
+    Results are stored next to the box sidecar as `.py.trn` JSON, and
+    pages whose box did not change since are skipped.
+
+    Args:
+        translator (Translator): Translator, shared by all workers.
+        target (str): Target language.
+        source (str): Source language.
+        concurrency (int): Number of pages translated at once.
+        collationString (str): String joining the boxes of a group.
+
+    Attributes:
+        done (int): Number of pages finished so far.
+        total (int): Number of pages scheduled.
+        errors (dict): Pages that failed, mapped to their error.
+    """
+
+    def __init__(self, translator:Translator, target='en', source='auto', concurrency=4, collationString=''):
+        self.translator = translator
+        self.target = target
+        self.source = source
+        self.concurrency = concurrency
+        self.collationString = collationString
+
+        self.done = 0
+        self.total = 0
+        self.errors = {}
+
+        self._lock = threading.Lock()
+        self._futures = []
+
+    def start(self, pages):
+        """Schedules pages for translation and returns immediately.
+
+        Args:
+            pages (list): `(name, basePath)` tuples, e.g. from
+                `archivePages`.
+
+        Returns:
+            A list of futures, one per page.
+        """
+        self.done = 0
+        self.total = len(pages)
+        self.errors = {}
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        self._futures = [executor.submit(self._translatePage, name, basePath) for name, basePath in pages]
+        executor.shutdown(wait=False)
+
+        return self._futures
+
+    def run(self, pages):
+        """Translates pages, blocking until all are done."""
+        for future in self.start(pages):
+            if not future.cancelled():
+                future.result()
+
+        return self.errors
+
+    def translateArchive(self, path, boxPath='box'):
+        return self.run(archivePages(path, boxPath))
+
+    def cancel(self):
+        """Drops pages that have not started yet."""
+        for future in self._futures:
+            if future.cancel():
+                with self._lock:
+                    self.done += 1
+
+    def _translatePage(self, name, basePath):
+        try:
+            self.translatePage(basePath)
+        except Exception as e:
+            # Anything a worker raises is reported with its page, never dropped
+            with self._lock:
+                self.errors[name] = e
+        finally:
+            with self._lock:
+                self.done += 1
+
+    def translatePage(self, basePath):
+        """Translates the groups of one page and stores the result.
+
+        Returns:
+            False if the page has no box sidecar or is up to date.
+        """
+        boxPath = basePath + '.py.box'
+        if not os.path.exists(boxPath):
+            return False
+
+        stamp = boxStamp(boxPath)
+        if loadTranslations(basePath, self.target):
+            return False
+
+        groups = collateGroups(boxPath, self.collationString)
+        translations = self.translator.translateBatch(list(groups.values()), target=self.target, source=self.source)
+
+        data = {
+            'source' : self.source,
+            'target' : self.target,
+            'stamp' : stamp,
+            'groups' : dict((str(n), text) for n, text in zip(groups, translations)),
+        }
+
+        path = translationPath(basePath)
+        with open(path + '.tmp', 'w', encoding="utf8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+        return True
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Translates the groups of every page in an archive.')
+    parser.add_argument('archive')
+    parser.add_argument('--target', default='en')
+    parser.add_argument('--source', default='auto')
+    parser.add_argument('--box-path', default='box')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=5)
+    parser.add_argument('--backend', default='google-web', choices=list(BACKENDS))
+    parser.add_argument('--service-url', action='append', dest='service_urls')
+    parser.add_argument('--api-key')
+    args = parser.parse_args()
+
+    with createTranslator(args.backend, service_urls=args.service_urls, api_key=args.api_key, rate_limit=args.rate) as translator:
+        scheduler = TranslationScheduler(translator, args.target, args.source, args.concurrency)
+        errors = scheduler.translateArchive(args.archive, args.box_path)
+
+    for name, error in errors.items():
+        print(f'{name}: {error}', file=sys.stderr)
+
+    print(f'{scheduler.done - len(errors)}/{scheduler.total} pages translated')
@@ -1,19 +1,399 @@
+import abc
 import requests
 import json
-import re
+import codecs
+import time
+import threading
 from urllib.parse import quote
 import random
 
+from requests.adapters import HTTPAdapter
+
 import translator_constants as TC
 
 # https://gist.github.com/Roadcrosser/e08ecf22d3e14dc555b15bfe8d46243c
 
-class Translator(object):
-    def __init__(self, service_urls=None):
-        self.service_urls = service_urls or ['translate.google.com'] # self.DEFAULT_SERVICE_URLS
-        
+# Separates batched segments. A lone symbol on its own line is kept
+# as is by the translation service, and survives sentence joining.
+SEGMENT_DELIMITER = '\n¶\n'
+
+# Longest query accepted by the translate web service
+MAX_QUERY_LENGTH = 5000
+
+class TranslationError(Exception):
+    """Raised when a query could not be translated by any service URL."""
+
+def isTransient(error):
+    """Checks whether a failed request is worth retrying.
+
+    Connection errors, timeouts, rate limiting (429) and server errors
+    (5xx) are transient. Other client errors and unexpected responses
+    fail the same way on every attempt.
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status == 429 or status >= 500
+
+    return False
+
+class RateLimiter(object):
+    """Thread-safe limiter spacing out calls to a given rate.
+
+    Args:
+        rate (float): Maximum number of calls per second.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1/rate
+        self.next = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next - now
+            self.next = max(now, self.next) + self.interval
+
+        if wait > 0:
+            time.sleep(wait)
+
+class Translator(abc.ABC):
+    """Base translation client.
+
+    Requests go through a pooled session, so consecutive translations
+    reuse the same connection instead of paying a new TCP and TLS
+    handshake each time. Transient failures are retried across all
+    service URLs, with exponential backoff between rounds. A service URL
+    failing in any other way is not tried again, but the others still are.
+
+    Backends implement `query`, sending one request for a list of
+    segments. Backends whose requests only carry a single text
+    (`multi_query = False`) get several segments packed into one text,
+    joined by `SEGMENT_DELIMITER`.
+
+    Args:
+        service_urls (list): Service hosts or URLs, tried in order.
+            Hosts without a scheme use HTTPS.
+        timeout (tuple): Connect and read timeout in seconds.
+        retries (int): Number of extra rounds over all service URLs.
+        backoff (float): Delay in seconds before the first retry round,
+            doubled for every further round.
+        pool_size (int): Maximum number of pooled connections per host.
+        rate_limit (float): Maximum number of requests per second, shared
+            by all threads using this translator. Unlimited if `None`.
+        memory (TranslationMemory): Translation memory consulted by
+            `translateBatch` before sending any request.
+        api_key (str): API key, for backends that need one.
+    """
+
+    # Identifies translations of this backend in the translation memory
+    backend = None
+    default_service_urls = []
+
+    # Whether a single request can carry several segments
+    multi_query = False
+    max_length = MAX_QUERY_LENGTH
+    max_segments = None
+
+    def __init__(self, service_urls=None, timeout=(3.05, 10), retries=2, backoff=0.5, pool_size=10, rate_limit=None, memory=None, api_key=None):
+        self.service_urls = service_urls or list(self.default_service_urls)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.memory = memory
+        self.api_key = api_key
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.service_urls), pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def serviceUrl(self, i=0):
+        url = self.service_urls[i]
+
+        return url if '://' in url else 'https://' + url
+
+    def post(self, url, **kwargs):
+        """Sends a rate limited POST request through the session."""
+        if self.limiter:
+            self.limiter.acquire()
+
+        r = self.session.post(url, timeout=self.timeout, **kwargs)
+        try:
+            r.raise_for_status()
+        except requests.HTTPError:
+            r.close()
+            raise
+
+        return r
+
+    def retry(self, func):
+        """Calls `func` with each service URL until it succeeds.
+
+        Service URLs are retried in later rounds only after transient
+        failures (see `isTransient`).
+
+        Raises:
+            TranslationError: If every service URL failed.
+        """
+        error = None
+        urls = list(range(len(self.service_urls)))
+
+        for attempt in range(self.retries + 1):
+            if not urls:
+                break
+
+            if attempt:
+                time.sleep(self.backoff*2**(attempt - 1))
+
+            for i in list(urls):
+                try:
+                    return func(self.serviceUrl(i))
+                except (requests.RequestException, ValueError, LookupError, TypeError, AttributeError) as e:
+                    error = e
+
+                    # HTTP client errors and unexpected response layouts
+                    # fail the same way again
+                    if not isTransient(e):
+                        urls.remove(i)
+
+        raise TranslationError(f'Translation failed on {", ".join(self.service_urls)}: {error}') from error
+
+    @abc.abstractmethod
+    def query(self, url, segments, source, target):
+        """Sends one request translating the given segments.
+
+        Returns:
+            A tuple `(translations, detected)` with one translation per
+            segment and the detected source language, if any.
+        """
+
+    def translate(self, query, target='en', source='auto', detailed=False):
+        """Translates a query.
+
+        Returns:
+            The translation. If `detailed`, a dict with the translation
+            in `resp`, and the `source` and `target` languages.
+
+        Raises:
+            TranslationError: If the request failed, see `retry`.
+        """
+        translations, detected = self.retry(lambda url: self.query(url, [query], source, target))
+
+        if detailed:
+            return {
+                'source' : detected or source,
+                'target' : target,
+                'resp'   : translations[0],
+            }
+        else:
+            return translations[0]
+
+    def translateBatch(self, segments, target='en', source='auto', max_length=None):
+        """Translates many segments in as few requests as possible.
+
+        Segments are packed into requests of at most `max_length`
+        characters. For backends without native multi-segment requests,
+        they are joined by `SEGMENT_DELIMITER` and the results are split
+        back per segment. If a result does not split into the expected
+        number of segments, the segments of that query are translated
+        one by one instead. Segments found in the translation memory are
+        not sent at all, and new translations are added to it.
+
+        Args:
+            segments (list): Texts to translate.
+            max_length (int): Maximum query length. Defaults to the
+                backend limit.
+
+        Returns:
+            A list with the translation of each segment. Blank segments
+            are returned as empty strings.
+
+        Raises:
+            TranslationError: If a segment is too long for one request, or
+                if a request failed.
+        """
+        if max_length is None:
+            max_length = self.max_length
+
+        results = [''] * len(segments)
+
+        pending = list(segments)
+        if self.memory is not None:
+            for i, segment in enumerate(segments):
+                if segment.strip():
+                    translation = self.memory.get(segment, source, target, self.backend)
+                    if translation is not None:
+                        results[i] = translation
+                        pending[i] = ''
+
+        for indices in self.packSegments(pending, max_length, self.max_segments, delimited=not self.multi_query):
+            if self.multi_query:
+                batch = [segments[i] for i in indices]
+                translations, _ = self.retry(lambda url: self.query(url, batch, source, target))
+                for i, translation in zip(indices, translations):
+                    results[i] = translation
+            elif len(indices) == 1:
+                results[indices[0]] = self.translate(segments[indices[0]], target=target, source=source, detailed=True)['resp']
+            else:
+                query = SEGMENT_DELIMITER.join(segments[i] for i in indices)
+                parts = self.translate(query, target=target, source=source, detailed=True)['resp'].split(SEGMENT_DELIMITER.strip())
+
+                if len(parts) == len(indices):
+                    for i, part in zip(indices, parts):
+                        results[i] = part.strip()
+                else:
+                    for i in indices:
+                        results[i] = self.translate(segments[i], target=target, source=source, detailed=True)['resp']
+
+            if self.memory is not None:
+                for i in indices:
+                    self.memory.put(segments[i], source, target, self.backend, results[i])
+
+        return results
+
+    @staticmethod
+    def packSegments(segments, max_length=MAX_QUERY_LENGTH, max_segments=None, delimited=True):
+        """Groups segment indices into batches that fit a single request.
+
+        Blank segments are skipped. When delimited, segments that contain
+        the delimiter themselves are sent on their own.
+
+        Raises:
+            TranslationError: If a segment alone is longer than
+                `max_length`, before anything is sent.
+        """
+        batches = []
+        batch = []
+        length = 0
+        separator = len(SEGMENT_DELIMITER) if delimited else 0
+
+        for i, segment in enumerate(segments):
+            if not segment.strip():
+                continue
+
+            if len(segment) > max_length:
+                raise TranslationError(f'Segment {i} has {len(segment)} characters, more than the {max_length} accepted in one request')
+
+            if delimited and SEGMENT_DELIMITER.strip() in segment:
+                batches.append([i])
+                continue
+
+            added = len(segment) + (separator if batch else 0)
+            if batch and (length + added > max_length or len(batch) == max_segments):
+                batches.append(batch)
+                batch, length, added = [], 0, len(segment)
+
+            batch.append(i)
+            length += added
+
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+def iterChunks(pieces):
+    """Splits a length-prefixed response stream into its chunks.
+
+    Batchexecute responses are a sequence of `<length>\n<chunk>\n`
+    records after an anti-XSSI prefix line, where the length counts the
+    newline ending the chunk. Text is consumed piece by piece as it
+    arrives, and only the chunk being read is buffered.
+
+    Args:
+        pieces (iterable): Decoded text, in arbitrary pieces.
+
+    Yields:
+        The text of each chunk.
+    """
+    head = ''
+    parts = []
+    size = 0
+    length = None
+
+    for piece in pieces:
+        pos = 0
+        end = len(piece)
+
+        while pos < end or length == size == 0:
+            if length is None:
+                nl = piece.find('\n', pos)
+                if nl < 0:
+                    head += piece[pos:]
+                    break
+
+                line = (head + piece[pos:nl]).strip()
+                head = ''
+                pos = nl + 1
+
+                # Anything but a length, like the prefix or the newline
+                # ending a chunk, is skipped
+                if line.isdigit():
+                    length = int(line) - 1
+                    parts = []
+                    size = 0
+            else:
+                take = piece[pos:pos + length - size]
+                parts.append(take)
+                size += len(take)
+                pos += len(take)
+
+                if size == length:
+                    length = None
+                    yield ''.join(parts)
+
+def iterStrings(l):
+    """Yields the strings of nested lists in order, without recursion."""
+    stack = [iter(l)]
+
+    while stack:
+        for item in stack[-1]:
+            if type(item) is list:
+                stack.append(iter(item))
+                break
+            elif type(item) is str:
+                yield item
+        else:
+            stack.pop()
+
+class GoogleWebTranslator(Translator):
+    """Google Translate web client, using the web app's RPC endpoint.
+
+    Responses are streamed and decoded chunk by chunk, so only the chunk
+    holding the translation is kept and parsed, and the connection is
+    released as soon as it was read.
+    """
+
+    backend = 'google-web'
+    default_service_urls = ['translate.google.com']
+
+    # Size of the pieces read from the response stream
+    read_size = 8192
+
+    def __init__(self, *args, **kwargs):
+        super(GoogleWebTranslator, self).__init__(*args, **kwargs)
+
+        self.session.headers.update({'Content-Type': 'application/x-www-form-urlencoded'})
+
     def generateBaseUrl(self, i=0):
-        return f"https://{self.service_urls[i]}/_/TranslateWebserverUi/data/batchexecute?rpcids=MkEWBc&rt=c&bl=boq_translate-webserver_20201110.10_p0"
+        return self.rpcUrl(self.serviceUrl(i))
+
+    @staticmethod
+    def rpcUrl(url):
+        return f"{url}/_/TranslateWebserverUi/data/batchexecute?rpcids=MkEWBc&rt=c&bl=boq_translate-webserver_20201110.10_p0"
 
     @staticmethod
     def flattenList(l):
@@ -21,86 +401,162 @@ class Translator(object):
         Flattens a list of nested lists
         """
         o = []
-        
-        for li in l:
-            if type(li) is list:
-                o.extend(Translator.flattenList(li))
+        stack = [iter(l)]
+
+        while stack:
+            for item in stack[-1]:
+                if type(item) is list:
+                    stack.append(iter(item))
+                    break
+                o.append(item)
             else:
-                o.append(li)
-        
+                stack.pop()
+
         return o
-    
+
     def translate(self, query, target='en', source='auto', detailed=False):
-        for i in range(len(self.service_urls)):
-            try:
-                url = self.generateBaseUrl(i)
-
-                # This is arcane
-                req = json.dumps([[query, source, target, True], [None]])
-                req = [[["MkEWBc", req, None, "generic"]]]
-                req = "f.req=" + quote(json.dumps(req)) # URL encode this
-
-                r = requests.post(url, headers={'Content-Type': 'application/x-www-form-urlencoded'}, data=req)
-
-                # Get the first number string
-                num_match = re.search(r"\n(\d+)\n", r.text)
-
-                # Find where the numbers end
-                front_pad = num_match.span()[1]
-                # The number tells us how many characters the next json block has
-                end_num = front_pad + int(num_match.groups()[0]) - 1
-
-                # Lots of arcane json processing. I recommend looking at the data in transit in a JSON viewer because I have no idea what is what.
-                data = json.loads(r.text[front_pad:end_num])
-                data = data[0][2]
-                data = json.loads(data)
-                data = data
-
-                resp = data[1][0]
-
-                if detailed:
-                    ret_source = data[0][2]
-                    ret_source = ret_source if ret_source else source
-
-                    ret_target = data[1][1]
-
-                    metadata = {
-                        'source'   : ret_source,
-                        'target'   : ret_target,
-                        'raw_resp' : resp,
-                    }
-
-                    ret = []
-                    if (len(resp) > 1):
-                        # For the case where feminine and masculine versions of the translation are returned.
-                        metadata['parsed_resp'] = [f"{i[0]}\n{i[2]}" for i in resp]
-                        metadata['resp'] = "\n\n".join(metadata['parsed_resp'])
-                    else:
-                        # metadata['parsed_resp'] = self.flattenList(resp[0][5])
-                        metadata['parsed_resp'] = [[option for option in self.flattenList(sentence) if type(option) is str] for sentence in metadata['raw_resp'][0][5]]
-                        # metadata['resp'] = metadata['parsed_resp'][0]
-                        metadata['resp'] = " ".join([options[0] for options in metadata['parsed_resp']])
-
-                    # metadata['resp'] = "\n\n".join(metadata['parsed_resp'])
-
-                    return metadata
-                else:
-                    # Get the actual translations.
-                    # There may be other cases or word arrangements I'm not aware of so the following may be incomplete.
-                    ret = []
-                    if (len(resp) > 1):
-                        # For the case where feminine and masculine versions of the translation are returned.
-                        ret += [f"{i[0]}\n{i[2]}" for i in resp]
-                    else:
-                        # Default case. I'm actually throwing away some "suggested translations" that you may want.
-                        ret += [resp[0][5][0][0]]
-
-                    return "\n\n".join(ret)
-            except:
-                pass
+        """Translates a query.
+
+        Raises:
+            TranslationError: If the request failed, see `retry`.
+        """
+        return self.retry(lambda url: self.fetch(url, query, source, target, detailed))
+
+    def query(self, url, segments, source, target):
+        metadata = self.fetch(url, segments[0], source, target, detailed=True)
+
+        return [metadata['resp']], metadata['source']
+
+    def fetch(self, url, query, source, target, detailed=False):
+        """Sends a query and parses the response as it streams in."""
+        with self.request(url, query, source, target) as r:
+            decoder = codecs.getincrementaldecoder(r.encoding or 'utf-8')(errors='replace')
+            pieces = (decoder.decode(data) for data in r.iter_content(self.read_size))
+
+            return self.parseResponse(pieces, source, detailed)
+
+    def request(self, url, query, source, target):
+        # This is arcane
+        req = json.dumps([[query, source, target, True], [None]])
+        req = [[["MkEWBc", req, None, "generic"]]]
+        req = "f.req=" + quote(json.dumps(req)) # URL encode this
+
+        return self.post(self.rpcUrl(url), data=req, stream=True)
+
+    def parseResponse(self, text, source='auto', detailed=False):
+        """Parses a response, given as text or as an iterable of pieces.
+
+        Chunks before the translation are skipped without decoding them,
+        and the rest of the response is not read at all.
+        """
+        if isinstance(text, str):
+            text = (text,)
+
+        for chunk in iterChunks(text):
+            if chunk.startswith('[["wrb.fr"'):
+                break
+        else:
+            raise ValueError('No translation in response')
+
+        # Lots of arcane json processing. I recommend looking at the data in transit in a JSON viewer because I have no idea what is what.
+        data = json.loads(chunk)
+        data = data[0][2]
+        data = json.loads(data)
+
+        resp = data[1][0]
+
+        if detailed:
+            ret_source = data[0][2]
+            ret_source = ret_source if ret_source else source
+
+            ret_target = data[1][1]
+
+            metadata = {
+                'source'   : ret_source,
+                'target'   : ret_target,
+                'raw_resp' : resp,
+            }
+
+            ret = []
+            if (len(resp) > 1):
+                # For the case where feminine and masculine versions of the translation are returned.
+                metadata['parsed_resp'] = [f"{i[0]}\n{i[2]}" for i in resp]
+                metadata['resp'] = "\n\n".join(metadata['parsed_resp'])
+            else:
+                # metadata['parsed_resp'] = self.flattenList(resp[0][5])
+                metadata['parsed_resp'] = [list(iterStrings(sentence)) for sentence in metadata['raw_resp'][0][5]]
+                # metadata['resp'] = metadata['parsed_resp'][0]
+                metadata['resp'] = " ".join([options[0] for options in metadata['parsed_resp']])
+
+            # metadata['resp'] = "\n\n".join(metadata['parsed_resp'])
+
+            return metadata
+        else:
+            # Get the actual translations.
+            # There may be other cases or word arrangements I'm not aware of so the following may be incomplete.
+            ret = []
+            if (len(resp) > 1):
+                # For the case where feminine and masculine versions of the translation are returned.
+                ret += [f"{i[0]}\n{i[2]}" for i in resp]
+            else:
+                # Default case. I'm actually throwing away some "suggested translations" that you may want.
+                ret += [resp[0][5][0][0]]
+
+            return "\n\n".join(ret)
+
+class GoogleCloudTranslator(Translator):
+    """Google Cloud Translation API (v2) client. Needs an API key."""
+
+    backend = 'google-cloud'
+    default_service_urls = ['translation.googleapis.com']
+
+    multi_query = True
+    max_segments = 128
+
+    def query(self, url, segments, source, target):
+        body = {'q' : segments, 'target' : target, 'format' : 'text'}
+        if source != 'auto':
+            body['source'] = source
+
+        r = self.post(f'{url}/language/translate/v2', params={'key' : self.api_key}, json=body)
+        translations = r.json()['data']['translations']
+
+        return [t['translatedText'] for t in translations], translations[0].get('detectedSourceLanguage')
+
+class LibreTranslateTranslator(Translator):
+    """LibreTranslate client, e.g. for a local, offline instance."""
+
+    backend = 'libretranslate'
+    default_service_urls = ['http://localhost:5000']
+
+    multi_query = True
+
+    def query(self, url, segments, source, target):
+        body = {'q' : segments, 'source' : source, 'target' : target, 'format' : 'text'}
+        if self.api_key:
+            body['api_key'] = self.api_key
+
+        data = self.post(f'{url}/translate', json=body).json()
+
+        detected = data.get('detectedLanguage')
+        if isinstance(detected, list):
+            detected = detected[0] if detected else None
+
+        return data['translatedText'], detected['language'] if detected else None
+
+BACKENDS = dict((cls.backend, cls) for cls in (GoogleWebTranslator, GoogleCloudTranslator, LibreTranslateTranslator))
+
+def createTranslator(backend='google-web', **kwargs):
+    """Creates a translator for a backend name in `BACKENDS`."""
+    try:
+        cls = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown translation backend '{backend}', expected one of {list(BACKENDS)}")
+
+    return cls(**kwargs)
 
 if __name__ == "__main__":
-    translator = Translator(['translate.google.ca'])
+    translator = GoogleWebTranslator(['translate.google.ca'])
 
     query = """太平洋は地球表面のおよそ3分の1を占め、その面積はおよそ1億7970万平方キロメートルである。これは世界の海の総面積の46%を占め、また地球のすべての陸地を足したよりも広い[1]。また、日本列島のおよそ473倍の面積である。
 